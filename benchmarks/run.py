@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Offline microbenchmarks for the producer and consumer hot paths.
+
+Runs without Docker or network: the service modules are imported directly and
+end-to-end cases go through Flask test clients. Results are written as JSON
+keyed by git commit and can be compared against a baseline run.
+
+Usage:
+    python benchmarks/run.py                      # run, save results/<commit>.json
+    python benchmarks/run.py --save-baseline      # also store as results/baseline.json
+    python benchmarks/run.py --compare baseline   # fail on regressions vs. baseline
+    python benchmarks/run.py -k consumer          # only benchmarks matching 'consumer'
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+def load_service(name):
+    """Import <name>/app.py under a unique module name (all services call it app.py)"""
+    spec = importlib.util.spec_from_file_location(f"{name}_app", ROOT / name / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+def measure(func, rounds, min_round_time):
+    """Calibrate an iteration count, then time `rounds` rounds; returns per-call seconds"""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        iterations *= 2 if elapsed == 0 else max(2, int(min_round_time / elapsed))
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        samples.append((time.perf_counter() - started) / iterations)
+    return {
+        'iterations': iterations,
+        'rounds': rounds,
+        'min_us': min(samples) * 1e6,
+        'median_us': statistics.median(samples) * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'stddev_us': (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e6
+    }
+
+def build_benchmarks():
+    """Return {name: zero-argument callable} for every benchmark case"""
+    producer = load_service('producer')
+    consumer = load_service('consumer')
+    consumer_client = consumer.app.test_client()
+    producer_client = producer.app.test_client()
+
+    reading = producer.generate_sensor_data()
+    processed = consumer.process_sensor_data(reading)
+    response_body = {
+        'message': 'Data processed successfully',
+        'original_data': reading,
+        'processed_data': processed,
+        'processing_timestamp': datetime.now().isoformat()
+    }
+    padded_4k = producer._approximate_payload_of_size(dict(reading), 4096)
+    fleet = producer.SensorFleet(100000, 1.0, seed=0)
+
+    def process_data_e2e(template):
+        def run():
+            data, trace = producer.generate_traced_sensor_data()
+            if template is not None:
+                # A fresh seq each call, or the consumer drops every repeat as a duplicate
+                data = {**template, 'seq': producer.allocate_sequence()}
+            payload = json.dumps(data)
+            consumer_client.post('/process-data', data=payload, headers={
+                'Content-Type': 'application/json', **producer.trace_headers(trace)
+            })
+        return run
+
+    def generate_then_process():
+        data = producer_client.get('/generate-data').get_json()['data']
+        consumer_client.post('/process-data', json=data)
+
+    def encode_response():
+        with consumer.app.app_context():
+            consumer.app.json.dumps(response_body)
+
+    return {
+        'producer.generate_sensor_data': producer.generate_sensor_data,
+        'producer.approximate_payload_512b': lambda: producer._approximate_payload_of_size(dict(reading), 512),
+        'producer.approximate_payload_64k': lambda: producer._approximate_payload_of_size(dict(reading), 65536),
+        'producer.sensor_fleet_sample_1000': lambda: fleet.sample(1000),
+        'consumer.process_sensor_data': lambda: consumer.process_sensor_data(reading),
+        'consumer.add_to_history': lambda: consumer.add_to_history(dict(processed)),
+        'consumer.encode_process_response': encode_response,
+        'consumer.view_all_data_cached': lambda: consumer_client.get('/view-all-data'),
+        'e2e.process_data': process_data_e2e(None),
+        'e2e.process_data_4k_payload': process_data_e2e(padded_4k),
+        'e2e.generate_then_process': generate_then_process
+    }
+
+def load_results(ref):
+    """Load a results file by path, commit SHA (or prefix), or 'baseline'"""
+    path = Path(ref)
+    if not path.exists():
+        path = RESULTS_DIR / f"{ref}.json"
+    if not path.exists():
+        matches = sorted(RESULTS_DIR.glob(f"{ref}*.json"))
+        if len(matches) != 1:
+            raise SystemExit(f"No unique benchmark results found for '{ref}'")
+        path = matches[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(current, baseline, threshold):
+    """Print a comparison table; return the names that regressed beyond `threshold`"""
+    regressions = []
+    print(f"\nComparison against {baseline['commit'][:12]} (threshold {threshold:.0%} on median)")
+    print(f"{'benchmark':40} {'baseline us':>12} {'current us':>12} {'change':>9}")
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            print(f"{name:40} {'-':>12} {result['median_us']:12.2f} {'new':>9}")
+            continue
+        change = (result['median_us'] - previous['median_us']) / previous['median_us']
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:40} {previous['median_us']:12.2f} {result['median_us']:12.2f} {change:+9.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='filter', default='', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-round-time', type=float, default=0.05, help='seconds per timed round')
+    parser.add_argument('--compare', metavar='REF', help="results to compare against: 'baseline', a commit SHA or a path")
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative median slowdown counted as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='also write results/baseline.json')
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = {}
+    # Services log every request; keep that cost but not the terminal noise
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        benchmarks = build_benchmarks()
+    for name, func in benchmarks.items():
+        if args.filter not in name:
+            continue
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results[name] = measure(func, args.rounds, args.min_round_time)
+        r = results[name]
+        print(f"{name:40} median {r['median_us']:10.2f} us  min {r['min_us']:10.2f} us  ±{r['stddev_us']:.2f}")
+
+    record = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = RESULTS_DIR / f"{commit}{'-dirty' if dirty else ''}.json"
+    if args.filter and out_path.exists():
+        # A filtered run refreshes its own entries without dropping the others
+        with open(out_path, 'r', encoding='utf-8') as f:
+            record['results'] = {**json.load(f).get('results', {}), **results}
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    print(f"\nResults written to {out_path.relative_to(ROOT)}")
+    if args.save_baseline:
+        with open(RESULTS_DIR / 'baseline.json', 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+        print("Saved as baseline")
+
+    if args.compare:
+        regressions = compare(record, load_results(args.compare), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,47 @@
 #!/usr/bin/env python3
 import os
+import sys
 import json
+import time
+import bisect
+import threading
+import zlib
+import mmap
+import marshal
+import struct
+from collections import deque
+from pathlib import Path
 import requests
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from datetime import datetime
 import psutil
 
 app = Flask(__name__)
 
 # Configuration
+SERVICE_NAME = 'Consumer Service'
 SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8002))
 PRODUCER_URL = os.getenv('PRODUCER_URL', 'http://producer:8001')
+QUEUE_PULL_ENABLED = os.getenv('QUEUE_PULL_ENABLED', '1') == '1'
+QUEUE_PREFETCH = int(os.getenv('QUEUE_PREFETCH', 100))
+QUEUE_LEASE_SECONDS = float(os.getenv('QUEUE_LEASE_SECONDS', 30))
+# This shard's partition on the producer queue (its host:port as listed in the producer's CONSUMER_URLS);
+# may be left empty when there is a single consumer
+QUEUE_PARTITION = os.getenv('QUEUE_PARTITION', '')
+# Idempotent ingest: readings seen again (by sensor_id + seq) within the window are dropped
+DEDUP_WINDOW_SECONDS = float(os.getenv('DEDUP_WINDOW_SECONDS', 300))
+DEDUP_CAPACITY = int(os.getenv('DEDUP_CAPACITY', 500000))
+# Periodic state snapshots for warm restarts (interval 0 disables them)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', str(Path(__file__).parent / 'snapshot_data' / 'consumer.snap'))
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv('SNAPSHOT_INTERVAL_SECONDS', 10))
 
 # Store the last received data
 last_received_data = None
 
 # Store all processed data for viewing
 processed_data_history = []
-max_history_size = 100  # Keep last 100 entries
+max_history_size = int(os.getenv('MAX_HISTORY_SIZE', 100))  # Keep last 100 entries by default
+history_version = 0  # bumped on every history change
 
 # Benchmark tracking state
 benchmark_tracking_enabled = False
@@ -25,17 +49,296 @@ benchmark_started_at = None
 benchmark_last_updated_at = None
 benchmark_counters = {
     'processed_count': 0,
-    'bytes_received': 0
+    'bytes_received': 0,
+    'duplicate_count': 0
 }
 
+# Sampling profiler
+PROFILE_MAX_SECONDS = 120
+PROFILE_MAX_HZ = 1000
+profile_stop = threading.Event()  # set by /admin/profile/stop to end a running capture early
+
+def sample_thread_stacks(seconds, hz):
+    """Sample every other thread's stack at `hz` for `seconds`; returns ({collapsed stack: count}, samples)"""
+    interval = 1.0 / hz
+    own_ident = threading.get_ident()
+    counts = {}
+    samples = 0
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time and not profile_stop.is_set():
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f"thread-{ident}"))
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+def to_speedscope(counts, hz, name):
+    """Convert collapsed stack counts into a speedscope 'sampled' profile document"""
+    frame_index = {}
+    frames = []
+    samples = []
+    weights = []
+    for stack, count in counts.items():
+        indices = []
+        for frame_name in stack.split(';'):
+            if frame_name not in frame_index:
+                frame_index[frame_name] = len(frames)
+                frames.append({'name': frame_name})
+            indices.append(frame_index[frame_name])
+        samples.append(indices)
+        weights.append(count / hz)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights
+        }],
+        'name': name,
+        'exporter': 'mssandbox'
+    }
+
+# Pipeline tracing state
+TRACE_STAGES = ('generate', 'serialize', 'network', 'parse', 'process', 'store')
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds, shared across request threads"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._min = None
+            self._max = None
+
+    def observe(self, value_ms):
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value_ms
+            self._min = value_ms if self._min is None else min(self._min, value_ms)
+            self._max = value_ms if self._max is None else max(self._max, value_ms)
+
+    def _quantile(self, counts, count, q):
+        """Upper bound of the bucket holding the q-th quantile (max for the overflow bucket)"""
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.buckets[index] if index < len(self.buckets) else self._max
+        return self._max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+            low, high = self._min, self._max
+            quantiles = {
+                f"p{int(q * 100)}": self._quantile(counts, count, q) if count else None
+                for q in (0.5, 0.9, 0.99)
+            }
+        return {
+            'count': count,
+            'mean_ms': (total / count) if count else None,
+            'min_ms': low,
+            'max_ms': high,
+            **quantiles,
+            'buckets': [
+                {'le': bound, 'count': bucket_count}
+                for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts)
+            ]
+        }
+
+end_to_end_histogram = LatencyHistogram()
+stage_histograms = {stage: LatencyHistogram() for stage in TRACE_STAGES}
+recent_traces = deque(maxlen=100)
+
+def extract_trace_context(headers):
+    """Read the producer's trace context from request headers (empty if absent)"""
+    trace = {
+        'trace_id': headers.get('X-Trace-Id'),
+        'parent_span_id': headers.get('X-Span-Id'),
+        'received_at': time.time(),
+        'stages': {}
+    }
+    try:
+        trace['generated_at'] = float(headers['X-Trace-Generated-At'])
+    except (KeyError, ValueError):
+        trace['generated_at'] = None
+    for item in headers.get('X-Trace-Stages', '').split(';'):
+        name, _, value = item.partition('=')
+        if name in TRACE_STAGES:
+            try:
+                trace['stages'][name] = float(value)
+            except ValueError:
+                pass
+    try:
+        # Wall clocks: only meaningful while producer and consumer share a host clock
+        sent_at = float(headers['X-Trace-Sent-At'])
+        trace['stages']['network'] = round(max(0.0, trace['received_at'] - sent_at) * 1000.0, 4)
+    except (KeyError, ValueError):
+        pass
+    return trace
+
+def record_stage(trace, stage, started):
+    """Record the elapsed time since `started` (a perf_counter value) for a stage"""
+    if trace is not None:
+        trace['stages'][stage] = round((time.perf_counter() - started) * 1000.0, 4)
+
+def finish_trace(trace):
+    """Feed a completed trace into the stage and end-to-end histograms"""
+    for stage, duration_ms in trace['stages'].items():
+        stage_histograms[stage].observe(duration_ms)
+    if trace.get('generated_at') is not None:
+        trace['end_to_end_ms'] = round(max(0.0, time.time() - trace['generated_at']) * 1000.0, 4)
+        end_to_end_histogram.observe(trace['end_to_end_ms'])
+    recent_traces.append({
+        'trace_id': trace.get('trace_id'),
+        'parent_span_id': trace.get('parent_span_id'),
+        'stages': trace['stages'],
+        'end_to_end_ms': trace.get('end_to_end_ms')
+    })
+
+def reset_trace_stats():
+    end_to_end_histogram.reset()
+    for histogram in stage_histograms.values():
+        histogram.reset()
+    recent_traces.clear()
+
+# Deduplication
+class SeenSet:
+    """Bounded, time-windowed set of reading keys with O(1) check-and-add.
+
+    Keys live in two generations. Lookups check both and inserts go to the
+    current one. Every window/2 seconds, or as soon as the current generation
+    holds capacity/2 keys, the previous generation is dropped and the current
+    one takes its place. A key is therefore remembered for between window/2
+    and window seconds, and never more than `capacity` keys are held. Under
+    heavy load the window shrinks rather than the memory growing; those
+    rotations are counted as `early_rotations`.
+    """
+
+    def __init__(self, window_seconds=DEDUP_WINDOW_SECONDS, capacity=DEDUP_CAPACITY):
+        self.window_seconds = window_seconds
+        self.capacity = max(2, capacity)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._current = set()
+            self._previous = set()
+            self._rotated_at = time.monotonic()
+            self.stats = {'checked': 0, 'duplicates': 0, 'unsequenced': 0, 'rotations': 0, 'early_rotations': 0}
+
+    @staticmethod
+    def key(reading):
+        """Stable 96-bit key: crc32(sensor_id) above the 64-bit sequence number; None without a seq"""
+        seq = reading.get('seq')
+        if not isinstance(seq, int) or isinstance(seq, bool):
+            return None
+        return (zlib.crc32(str(reading.get('sensor_id', '')).encode('utf-8')) << 64) | (seq & 0xFFFFFFFFFFFFFFFF)
+
+    def _rotate_if_due(self):
+        now = time.monotonic()
+        full = len(self._current) >= self.capacity // 2
+        if full or now - self._rotated_at >= self.window_seconds / 2:
+            self._previous = self._current
+            self._current = set()
+            self._rotated_at = now
+            self.stats['rotations'] += 1
+            if full:
+                self.stats['early_rotations'] += 1
+
+    def filter_new(self, readings):
+        """Return the readings not seen before, remembering them; readings without a seq always pass"""
+        fresh = []
+        with self._lock:
+            for reading in readings:
+                key = self.key(reading)
+                if key is None:
+                    self.stats['unsequenced'] += 1
+                    fresh.append(reading)
+                    continue
+                self.stats['checked'] += 1
+                if key in self._current or key in self._previous:
+                    self.stats['duplicates'] += 1
+                    continue
+                self._rotate_if_due()
+                self._current.add(key)
+                fresh.append(reading)
+        return fresh
+
+    def export_state(self):
+        """Keys and counters for a state snapshot; only the live generation is copied under the lock"""
+        with self._lock:
+            state = {
+                'current': list(self._current),
+                'previous': self._previous,
+                'age_seconds': time.monotonic() - self._rotated_at,
+                'stats': dict(self.stats)
+            }
+        # The previous generation is never mutated once rotated out
+        state['previous'] = list(state['previous'])
+        return state
+
+    def restore_state(self, current, previous, age_seconds, stats, downtime_seconds):
+        """Reload exported keys, ageing them by the time the service was down"""
+        age = age_seconds + max(0.0, downtime_seconds)
+        with self._lock:
+            self.stats = dict(stats)
+            if age >= self.window_seconds:
+                return
+            self._current = set(current)
+            self._previous = set(previous)
+            self._rotated_at = time.monotonic() - age
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'window_seconds': self.window_seconds,
+                'capacity': self.capacity,
+                'size': len(self._current) + len(self._previous),
+                **self.stats
+            }
+
+seen_readings = SeenSet()
+
 def reset_benchmark_counters():
     global benchmark_counters, benchmark_started_at, benchmark_last_updated_at
     benchmark_counters = {
         'processed_count': 0,
-        'bytes_received': 0
+        'bytes_received': 0,
+        'duplicate_count': 0
     }
     benchmark_started_at = datetime.now().isoformat()
     benchmark_last_updated_at = benchmark_started_at
+    reset_trace_stats()
 
 def process_sensor_data(data):
     """Process sensor data and add analysis"""
@@ -71,18 +374,322 @@ def process_sensor_data(data):
     
     return processed_data
 
-def add_to_history(processed_data):
-    """Add processed data to history"""
-    global processed_data_history
+def add_to_history(processed_data, trace=None):
+    """Add processed data to history, closing out the reading's trace if given"""
+    add_batch_to_history([processed_data], trace)
+
+def add_batch_to_history(processed_batch, trace=None):
+    """Add a batch of processed readings to history in one trim"""
+    global processed_data_history, history_version
+    started = time.perf_counter()
     
     # Add to history
-    processed_data_history.append(processed_data)
+    processed_data_history.extend(processed_batch)
     
     # Keep only the last max_history_size entries
     if len(processed_data_history) > max_history_size:
         processed_data_history = processed_data_history[-max_history_size:]
+    history_version += 1
+    
+    if trace is not None:
+        record_stage(trace, 'store', started)
+        finish_trace(trace)
+    
+    if len(processed_batch) == 1:
+        print(f"📊 Added to history: {processed_batch[0].get('sensor_id', 'UNKNOWN')} - Total entries: {len(processed_data_history)}")
+    else:
+        print(f"📊 Added {len(processed_batch)} readings to history - Total entries: {len(processed_data_history)}")
+
+def ingest_readings(readings, trace=None, raw_size=0):
+    """Process and store a batch of readings, skipping duplicates; shared by HTTP push and queue pull"""
+    global last_received_data, benchmark_last_updated_at
+    
+    # Drop readings already ingested (producer retries, queue redeliveries)
+    fresh = seen_readings.filter_new(readings)
+    duplicates = len(readings) - len(fresh)
+    if benchmark_tracking_enabled and duplicates:
+        benchmark_counters['duplicate_count'] += duplicates
+    if not fresh:
+        return []
+    readings = fresh
+    
+    # Store the received data
+    last_received_data = readings[-1].copy()
     
-    print(f"📊 Added to history: {processed_data.get('sensor_id', 'UNKNOWN')} - Total entries: {len(processed_data_history)}")
+    # Process the data
+    started = time.perf_counter()
+    processed_batch = [process_sensor_data(reading) for reading in readings]
+    record_stage(trace, 'process', started)
+    
+    # Add to history
+    add_batch_to_history(processed_batch, trace)
+
+    # If benchmark tracking is enabled, update counters
+    if benchmark_tracking_enabled:
+        benchmark_counters['processed_count'] += len(readings)
+        benchmark_counters['bytes_received'] += raw_size
+        benchmark_last_updated_at = datetime.now().isoformat()
+    return processed_batch
+
+# Serialized /view-all-data response, rebuilt on the first read after a history change.
+# ETags carry a per-process id so a restarted consumer never matches a stale client copy.
+VIEW_CACHE_INSTANCE = os.urandom(4).hex()
+view_cache = {
+    'version': None,
+    'body': b'',
+    'etag': None,
+    'bytes': 0,
+    'builds': 0,
+    'hits': 0
+}
+view_cache_lock = threading.Lock()
+
+def cached_view_body():
+    """Return (body, etag) for the current history, serializing only when history_version moved"""
+    with view_cache_lock:
+        # Read the version before the list: the body may be newer than its label, never older
+        version = history_version
+        if view_cache['version'] == version:
+            view_cache['hits'] += 1
+            return view_cache['body'], view_cache['etag']
+        history = processed_data_history[:]
+        body = app.json.dumps({
+            'message': f'Retrieved {len(history)} processed data entries',
+            'total_entries': len(history),
+            'data': history,
+            'timestamp': datetime.now().isoformat()
+        }).encode('utf-8')
+        view_cache.update(version=version, body=body, bytes=len(body), etag=f'{VIEW_CACHE_INSTANCE}-{version}')
+        view_cache['builds'] += 1
+        return body, view_cache['etag']
+
+# Streaming export: records are encoded and flushed in groups to keep per-chunk overhead low
+EXPORT_CHUNK_RECORDS = 500
+
+def export_records(history, end, fields):
+    """Yield NDJSON chunks for history[:end], keeping only `fields` when given"""
+    lines = []
+    for index in range(end):
+        record = history[index]
+        if fields:
+            record = {field: record[field] for field in fields if field in record}
+        lines.append(json.dumps(record, separators=(',', ':')))
+        if len(lines) == EXPORT_CHUNK_RECORDS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+# State snapshots: a binary file of marshal-encoded sections, mapped into memory on restore.
+# Layout: header (magic, marshal version, section count), then one table entry per section
+# (name, offset, length, crc32), then the section bodies. Large lists are split over several
+# sections of the same name so no single encode call holds the GIL for long.
+SNAPSHOT_MAGIC = b'MSSNAP01'
+SNAPSHOT_CHUNK_ITEMS = 5000
+SNAPSHOT_CHUNKED = ('history', 'seen_cur', 'seen_old')
+SNAPSHOT_HEADER = struct.Struct('<8sII')
+SNAPSHOT_SECTION = struct.Struct('<8sQQI')
+
+snapshot_lock = threading.Lock()
+snapshot_stats = {
+    'path': SNAPSHOT_PATH,
+    'interval_seconds': SNAPSHOT_INTERVAL_SECONDS,
+    'writes': 0,
+    'skipped': 0,
+    'errors': 0,
+    'last_error': None,
+    'last_written_at': None,
+    'last_bytes': None,
+    'last_write_ms': None,
+    'restored_entries': None,
+    'restore_ms': None
+}
+
+def snapshot_fingerprint():
+    """Changes whenever anything a snapshot holds has changed"""
+    return (history_version, benchmark_tracking_enabled, benchmark_started_at, benchmark_counters.get('duplicate_count'))
+
+def capture_state():
+    """Gather references to the current state; history entries are never mutated, so a shallow copy is enough"""
+    dedup = seen_readings.export_state()
+    return {
+        'meta': {
+            'written_at': time.time(),
+            'history_version': history_version,
+            'last_received_data': last_received_data,
+            'benchmark_tracking_enabled': benchmark_tracking_enabled,
+            'benchmark_started_at': benchmark_started_at,
+            'benchmark_last_updated_at': benchmark_last_updated_at,
+            'benchmark_counters': dict(benchmark_counters)
+        },
+        'dedup': {'age_seconds': dedup['age_seconds'], 'stats': dedup['stats']},
+        'history': list(processed_data_history),
+        'seen_cur': dedup['current'],
+        'seen_old': dedup['previous']
+    }
+
+def write_snapshot(path=SNAPSHOT_PATH):
+    """Encode the state into <path>.tmp, fsync it, then atomically rename it over <path>"""
+    with snapshot_lock:
+        started = time.perf_counter()
+        fingerprint = snapshot_fingerprint()
+        sections = []
+        for name, value in capture_state().items():
+            if name in SNAPSHOT_CHUNKED:
+                sections.extend(
+                    (name.encode('ascii'), marshal.dumps(value[start:start + SNAPSHOT_CHUNK_ITEMS]))
+                    for start in range(0, len(value), SNAPSHOT_CHUNK_ITEMS)
+                )
+            else:
+                sections.append((name.encode('ascii'), marshal.dumps(value)))
+        offset = SNAPSHOT_HEADER.size + SNAPSHOT_SECTION.size * len(sections)
+        table = []
+        for name, blob in sections:
+            table.append(SNAPSHOT_SECTION.pack(name, offset, len(blob), zlib.crc32(blob)))
+            offset += len(blob)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, marshal.version, len(sections)))
+            f.writelines(table)
+            f.writelines(blob for _, blob in sections)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        snapshot_stats.update(
+            writes=snapshot_stats['writes'] + 1,
+            last_written_at=datetime.now().isoformat(),
+            last_bytes=offset,
+            last_write_ms=round((time.perf_counter() - started) * 1000.0, 3)
+        )
+        return fingerprint
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """Map a snapshot file and decode its sections; raises ValueError if it is invalid"""
+    state = {name: [] for name in SNAPSHOT_CHUNKED}
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < SNAPSHOT_HEADER.size:
+            raise ValueError('Snapshot file is truncated')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            magic, marshal_version, count = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError('Not a consumer snapshot')
+            if marshal_version > marshal.version:
+                raise ValueError(f'Snapshot uses marshal version {marshal_version}, newer than {marshal.version}')
+            for index in range(count):
+                name, offset, length, crc = SNAPSHOT_SECTION.unpack_from(view, SNAPSHOT_HEADER.size + index * SNAPSHOT_SECTION.size)
+                name = name.rstrip(b'\0').decode('ascii')
+                with view[offset:offset + length] as blob:
+                    if len(blob) != length or zlib.crc32(blob) != crc:
+                        raise ValueError(f'Snapshot section {name} is corrupt')
+                    if name in SNAPSHOT_CHUNKED:
+                        state[name].extend(marshal.loads(blob))
+                    else:
+                        state[name] = marshal.loads(blob)
+    return state
+
+def restore_snapshot(path=SNAPSHOT_PATH):
+    """Load the last snapshot, if any, before serving; a missing or invalid file means a cold start"""
+    global processed_data_history, history_version, last_received_data
+    global benchmark_tracking_enabled, benchmark_started_at, benchmark_last_updated_at
+    if not os.path.exists(path):
+        print(f"🧊 No snapshot at {path}, starting cold")
+        return False
+    started = time.perf_counter()
+    try:
+        state = read_snapshot(path)
+        meta = state['meta']
+        restored = (
+            state['history'][-max_history_size:], meta['history_version'], meta['last_received_data'],
+            meta['benchmark_tracking_enabled'], meta['benchmark_started_at'], meta['benchmark_last_updated_at'],
+            dict(meta['benchmark_counters'])
+        )
+        snapshot_age = time.time() - meta['written_at']
+        dedup = state.get('dedup')
+        dedup_state = (state['seen_cur'], state['seen_old'], dedup['age_seconds'], dedup['stats']) if dedup else None
+    except (OSError, ValueError, EOFError, TypeError, KeyError) as e:
+        print(f"⚠️ Ignoring unreadable snapshot {path}: {e}")
+        return False
+    (processed_data_history, history_version, last_received_data,
+     benchmark_tracking_enabled, benchmark_started_at, benchmark_last_updated_at, counters) = restored
+    benchmark_counters.update(counters)
+    if dedup_state is not None:
+        seen_readings.restore_state(*dedup_state, snapshot_age)
+    snapshot_stats.update(
+        restored_entries=len(processed_data_history),
+        restore_ms=round((time.perf_counter() - started) * 1000.0, 3)
+    )
+    print(f"♻️ Restored {len(processed_data_history)} history entries from snapshot in {snapshot_stats['restore_ms']} ms")
+    return True
+
+def snapshot_worker():
+    """Write a snapshot every interval, skipping intervals in which nothing changed"""
+    last_fingerprint = snapshot_fingerprint()
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        if snapshot_fingerprint() == last_fingerprint:
+            snapshot_stats['skipped'] += 1
+            continue
+        try:
+            last_fingerprint = write_snapshot()
+        except Exception as e:
+            snapshot_stats['errors'] += 1
+            snapshot_stats['last_error'] = str(e)
+            print(f"❌ Snapshot failed: {e}")
+
+def start_snapshotter():
+    threading.Thread(target=snapshot_worker, daemon=True).start()
+    print(f"💾 Snapshots every {SNAPSHOT_INTERVAL_SECONDS}s to {SNAPSHOT_PATH}")
+
+# Queue transport: pull readings from the producer's durable queue
+queue_pull_stats = {
+    'running': False,
+    'pulled': 0,
+    'acked': 0,
+    'errors': 0,
+    'last_error': None
+}
+
+def queue_pull_worker():
+    """Long-poll the producer queue, process each prefetched batch, then ack it"""
+    session = requests.Session()
+    partition = {'partition': QUEUE_PARTITION} if QUEUE_PARTITION else {}
+    queue_pull_stats['running'] = True
+    while True:
+        try:
+            response = session.get(
+                f"{PRODUCER_URL}/queue/pull",
+                params={'max': QUEUE_PREFETCH, 'lease_seconds': QUEUE_LEASE_SECONDS, 'wait_seconds': 1, **partition},
+                timeout=10
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Queue pull failed with HTTP {response.status_code}")
+            messages = response.json().get('messages', [])
+            if not messages:
+                continue
+            queue_pull_stats['pulled'] += len(messages)
+            for message in messages:
+                body = message['body']
+                trace = extract_trace_context(body.get('trace') or {})
+                ingest_readings([body['data']], trace, message.get('size', 0))
+            ack = session.post(
+                f"{PRODUCER_URL}/queue/ack",
+                params=partition,
+                json={'ids': [message['id'] for message in messages]},
+                timeout=10
+            )
+            if ack.status_code == 200:
+                queue_pull_stats['acked'] += ack.json().get('acked', 0)
+        except Exception as e:
+            # Unacked messages are redelivered once their lease expires
+            queue_pull_stats['errors'] += 1
+            queue_pull_stats['last_error'] = str(e)
+            time.sleep(1)
+
+def start_queue_puller():
+    threading.Thread(target=queue_pull_worker, daemon=True).start()
+    print(f"📥 Queue puller started (prefetch {QUEUE_PREFETCH}, lease {QUEUE_LEASE_SECONDS}s)")
 
 @app.route('/')
 def home():
@@ -95,48 +702,72 @@ def home():
             'process_data': '/process-data',
             'get_processed_data': '/get-processed-data',
             'view_all_data': '/view-all-data',
+            'export': '/export',
             'clear_history': '/clear-history',
+            'trace_stats': '/trace/stats',
+            'trace_reset': '/trace/reset',
+            'dedup_stats': '/dedup/stats',
+            'snapshot': '/admin/snapshot',
+            'profile': '/admin/profile',
+            'profile_stop': '/admin/profile/stop',
             'status': '/status'
         }
     })
 
 @app.route('/process-data', methods=['POST'])
 def process_data():
-    """Process incoming sensor data"""
-    global last_received_data, benchmark_tracking_enabled, benchmark_counters, benchmark_last_updated_at
-    
+    """Process incoming sensor data (a single reading or a JSON list of readings)"""
     try:
         # Capture raw request size for throughput accounting
+        trace = extract_trace_context(request.headers)
         raw_payload = request.get_data(cache=True)
         raw_size = len(raw_payload) if raw_payload is not None else 0
+        started = time.perf_counter()
         data = request.get_json()
+        record_stage(trace, 'parse', started)
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Store the received data
-        last_received_data = data.copy()
-        
-        # Process the data
-        processed_data = process_sensor_data(data)
-        
-        # Add to history
-        add_to_history(processed_data)
-
-        # If benchmark tracking is enabled, update counters
-        if benchmark_tracking_enabled:
-            benchmark_counters['processed_count'] += 1
-            benchmark_counters['bytes_received'] += raw_size
-            benchmark_last_updated_at = datetime.now().isoformat()
+        readings = data if isinstance(data, list) else [data]
+        if not all(isinstance(reading, dict) for reading in readings):
+            return jsonify({'error': 'Readings must be JSON objects'}), 400
         
-        print(f"Processed data from sensor: {data.get('sensor_id', 'UNKNOWN')}")
+        processed_batch = ingest_readings(readings, trace, raw_size)
         
-        return jsonify({
-            'message': 'Data processed successfully',
-            'original_data': data,
-            'processed_data': processed_data,
-            'processing_timestamp': datetime.now().isoformat()
-        })
+        if isinstance(data, list):
+            print(f"Processed batch of {len(readings)} readings")
+            response = jsonify({
+                'message': 'Batch processed successfully',
+                'processed_count': len(processed_batch),
+                'duplicate_count': len(readings) - len(processed_batch),
+                'processing_timestamp': datetime.now().isoformat()
+            })
+        elif not processed_batch:
+            # Already ingested: acknowledge so a retrying producer treats it as delivered
+            print(f"Duplicate reading ignored: {data.get('sensor_id', 'UNKNOWN')} seq {data.get('seq')}")
+            response = jsonify({
+                'message': 'Duplicate reading ignored',
+                'duplicate': True,
+                'original_data': data,
+                'processed_data': None,
+                'processing_timestamp': datetime.now().isoformat()
+            })
+        else:
+            print(f"Processed data from sensor: {data.get('sensor_id', 'UNKNOWN')}")
+            response = jsonify({
+                'message': 'Data processed successfully',
+                'original_data': data,
+                'processed_data': processed_batch[0],
+                'processing_timestamp': datetime.now().isoformat()
+            })
+        if trace['trace_id']:
+            response.headers['X-Trace-Id'] = trace['trace_id']
+        response.headers['Server-Timing'] = ', '.join(
+            f"{stage};dur={trace['stages'][stage]}"
+            for stage in ('parse', 'process', 'store') if stage in trace['stages']
+        )
+        return response
         
     except Exception as e:
         return jsonify({
@@ -175,7 +806,40 @@ def benchmark_stats():
         'started_at': benchmark_started_at,
         'last_updated_at': benchmark_last_updated_at,
         'processed_count': benchmark_counters['processed_count'],
-        'bytes_received': benchmark_counters['bytes_received']
+        'bytes_received': benchmark_counters['bytes_received'],
+        'duplicate_count': benchmark_counters['duplicate_count'],
+        'end_to_end_latency_ms': end_to_end_histogram.snapshot()
+    })
+
+@app.route('/dedup/stats')
+def dedup_stats():
+    """Duplicate counters and the current size of the seen-set"""
+    return jsonify({**seen_readings.snapshot(), 'timestamp': datetime.now().isoformat()})
+
+@app.route('/trace/stats')
+def trace_stats():
+    """Return end-to-end and per-stage latency histograms plus the most recent traces"""
+    try:
+        n = int(request.args.get('n', 20))
+        if n < 0:
+            raise ValueError(f'n must be >= 0, got {n}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    traces = list(recent_traces)
+    return jsonify({
+        'end_to_end': end_to_end_histogram.snapshot(),
+        'stages': {stage: stage_histograms[stage].snapshot() for stage in TRACE_STAGES},
+        'recent_traces': traces[max(0, len(traces) - n):],
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/trace/reset')
+def trace_reset():
+    """Clear latency histograms and recent traces"""
+    reset_trace_stats()
+    return jsonify({
+        'message': 'Trace statistics reset',
+        'timestamp': datetime.now().isoformat()
     })
 
 @app.route('/get-processed-data')
@@ -224,20 +888,30 @@ def get_processed_data():
 
 @app.route('/view-all-data')
 def view_all_data():
-    """View all processed data in a formatted way"""
-    return jsonify({
-        'message': f'Retrieved {len(processed_data_history)} processed data entries',
-        'total_entries': len(processed_data_history),
-        'data': processed_data_history,
-        'timestamp': datetime.now().isoformat()
-    })
+    """View all processed data; served from the version cache, 304 when If-None-Match still matches"""
+    body, etag = cached_view_body()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/export')
+def export_data():
+    """Stream the history as NDJSON, one record per line; ?fields=a,b keeps only those fields"""
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    # Appends land past `end` and trims rebind the list, so history[:end] stays stable without a copy
+    history = processed_data_history
+    end = len(history)
+    return Response(export_records(history, end, fields), mimetype='application/x-ndjson',
+                    headers={'X-Total-Entries': str(end)})
 
 @app.route('/clear-history')
 def clear_history():
     """Clear the data history"""
-    global processed_data_history
+    global processed_data_history, history_version
     count = len(processed_data_history)
     processed_data_history = []
+    history_version += 1
     return jsonify({
         'message': f'Cleared {count} entries from history',
         'total_entries': 0
@@ -253,7 +927,12 @@ def status():
         'producer_url': PRODUCER_URL,
         'last_data_sensor_id': last_received_data.get('sensor_id') if last_received_data else None,
         'history_entries': len(processed_data_history),
-        'max_history_size': max_history_size
+        'max_history_size': max_history_size,
+        'queue_puller': queue_pull_stats,
+        'dedup': seen_readings.snapshot(),
+        'snapshot': snapshot_stats,
+        'view_cache': {key: value for key, value in view_cache.items() if key != 'body'},
+        'queue_partition': QUEUE_PARTITION or None
     })
 
 # System metrics endpoint
@@ -282,7 +961,53 @@ def metrics():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Profiling endpoint
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample all threads for a while and return collapsed stacks or a speedscope file"""
+    try:
+        seconds = min(PROFILE_MAX_SECONDS, max(0.1, float(request.args.get('seconds', 5))))
+        hz = min(PROFILE_MAX_HZ, max(1, int(request.args.get('hz', 100))))
+        fmt = request.args.get('format', 'speedscope')
+        if fmt not in ('speedscope', 'collapsed'):
+            return jsonify({'error': f'Unknown profile format: {fmt}'}), 400
+        profile_stop.clear()
+        counts, samples = sample_thread_stacks(seconds, hz)
+        print(f"🔬 Profile captured: {samples} samples over {seconds}s at {hz} Hz")
+        if fmt == 'collapsed':
+            body = ''.join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+            return Response(body, mimetype='text/plain')
+        return jsonify(to_speedscope(counts, hz, f"{SERVICE_NAME} ({seconds}s @ {hz} Hz)"))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/admin/profile/stop')
+def admin_profile_stop():
+    """End a running profile capture early; it returns the samples taken so far"""
+    profile_stop.set()
+    return jsonify({'stopped': True})
+
+# Snapshot endpoint
+@app.route('/admin/snapshot')
+def admin_snapshot():
+    """Write a state snapshot now"""
+    try:
+        write_snapshot()
+        return jsonify({'message': 'Snapshot written', **snapshot_stats})
+    except OSError as e:
+        snapshot_stats['errors'] += 1
+        snapshot_stats['last_error'] = str(e)
+        return jsonify({'error': f'Snapshot failed: {str(e)}'}), 500
+
 if __name__ == '__main__':
     print(f"CONSUMER SERVICE STARTED on port {SERVICE_PORT}")
     print(f"Producer URL: {PRODUCER_URL}")
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Restore before the puller starts so the dedup window covers redelivered messages
+        restore_snapshot()
+        if SNAPSHOT_INTERVAL_SECONDS > 0:
+            start_snapshotter()
+        if QUEUE_PULL_ENABLED:
+            start_queue_puller()
     app.run(host='0.0.0.0', port=SERVICE_PORT, debug=True)
@@ -1,23 +1,73 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
 import random
 import json
 import requests
 import threading
-from flask import Flask, jsonify, request
+import uuid
+import bisect
+import hashlib
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlparse
+from flask import Flask, Response, jsonify, request
 from datetime import datetime
+import numpy as np
 import psutil
 
 app = Flask(__name__)
 
 # Configuration
+SERVICE_NAME = 'Producer Service'
 SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8001))
 CONSUMER_URL = os.getenv('CONSUMER_URL', 'http://consumer:8002')
+# Comma-separated consumer shards; readings are routed by consistent hashing on sensor_id
+CONSUMER_URLS = [url.strip().rstrip('/') for url in os.getenv('CONSUMER_URLS', CONSUMER_URL).split(',') if url.strip()]
+SHARD_VIRTUAL_NODES = int(os.getenv('SHARD_VIRTUAL_NODES', 64))
+SHARD_RETRY_SECONDS = float(os.getenv('SHARD_RETRY_SECONDS', 5))
+TRANSPORTS = ('http', 'queue')
+TRANSPORT = os.getenv('TRANSPORT', 'http')  # default for automation and /send-data
+QUEUE_DIR = os.getenv('QUEUE_DIR', str(Path(__file__).parent / 'queue_data'))
+QUEUE_FSYNC = os.getenv('QUEUE_FSYNC', '0') == '1'
+QUEUE_MAX_DEPTH = int(os.getenv('QUEUE_MAX_DEPTH', 1000000))
+# Adaptive flow control for HTTP sends (AIMD concurrency limit + retry budget)
+FLOW_INITIAL_LIMIT = int(os.getenv('FLOW_INITIAL_LIMIT', 4))
+FLOW_MIN_LIMIT = int(os.getenv('FLOW_MIN_LIMIT', 1))
+FLOW_MAX_LIMIT = int(os.getenv('FLOW_MAX_LIMIT', 256))
+FLOW_LATENCY_TARGET_MS = float(os.getenv('FLOW_LATENCY_TARGET_MS', 100))
+FLOW_MAX_ERROR_RATE = float(os.getenv('FLOW_MAX_ERROR_RATE', 0.05))
+FLOW_BACKOFF_RATIO = float(os.getenv('FLOW_BACKOFF_RATIO', 0.5))
+FLOW_ACQUIRE_TIMEOUT = float(os.getenv('FLOW_ACQUIRE_TIMEOUT', 5))
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 3))
+RETRY_BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', 0.1))
+RETRY_MIN_PER_SECOND = float(os.getenv('RETRY_MIN_PER_SECOND', 5))
+RETRY_BASE_MS = float(os.getenv('RETRY_BASE_MS', 10))
+RETRY_CAP_MS = float(os.getenv('RETRY_CAP_MS', 2000))
+# Sensor fleet simulation (benchmark source 'fleet')
+SOURCES = ('random', 'fleet')
+SIM_FLEET_SIZE = int(os.getenv('SIM_FLEET_SIZE', 100000))
+SIM_RATE_SKEW = float(os.getenv('SIM_RATE_SKEW', 1.0))  # lognormal sigma of per-sensor rates; 0 = uniform
+SIM_DRIFT_TAU_SECONDS = float(os.getenv('SIM_DRIFT_TAU_SECONDS', 600))
+SIM_SEED = int(os.getenv('SIM_SEED')) if os.getenv('SIM_SEED') else None
 
 # Store the last generated data
 last_generated_data = None
 
+# Reading sequence numbers: (sensor_id, seq) identifies a reading for consumer-side dedup.
+# Seeded from the boot time in microseconds so numbers keep increasing across restarts.
+_next_sequence = time.time_ns() // 1000
+_sequence_lock = threading.Lock()
+
+def allocate_sequence(count=1):
+    """Reserve `count` consecutive sequence numbers; returns the first"""
+    global _next_sequence
+    with _sequence_lock:
+        first = _next_sequence
+        _next_sequence += count
+    return first
+
 # Automation control
 automation_running = False
 automation_thread = None
@@ -29,7 +79,12 @@ benchmark_thread = None
 benchmark_config = {
     'duration_seconds': 0,
     'payload_bytes': 0,
-    'workers': 1
+    'workers': 1,
+    'batch_size': 1,
+    'target_rps': 0,
+    'transport': 'http',
+    'flow_control': True,
+    'source': 'random'
 }
 benchmark_stats = {
     'started_at': None,
@@ -37,9 +92,695 @@ benchmark_stats = {
     'attempted': 0,
     'succeeded': 0,
     'failed': 0,
-    'bytes_sent': 0
+    'rejected': 0,
+    'bytes_sent': 0,
+    'readings_sent': 0
+}
+
+class QueueFull(Exception):
+    pass
+
+class DurableQueue:
+    """Append-only on-disk message queue with leased, at-least-once delivery.
+
+    Messages go to <dir>/messages.log and acks to <dir>/acks.log, so anything
+    not yet acknowledged survives a restart. Pulled messages are leased; when a
+    lease expires without an ack the message goes back to the head of the queue.
+    Both logs are truncated whenever the queue drains completely. Files are
+    opened on first use so importing the module has no side effects.
+    """
+
+    def __init__(self, directory, fsync=False, max_depth=QUEUE_MAX_DEPTH):
+        self.directory = Path(directory)
+        self.fsync = fsync
+        self.max_depth = max_depth
+        self._cond = threading.Condition()
+        self._opened = False
+        self._pending = deque()  # (id, body, size)
+        self._inflight = {}  # id -> (lease deadline, body, size)
+        self._next_id = 1
+        self.stats = {'published': 0, 'delivered': 0, 'redelivered': 0, 'acked': 0}
+
+    def _open(self):
+        if self._opened:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        messages_path = self.directory / 'messages.log'
+        acks_path = self.directory / 'acks.log'
+        acked = set()
+        if acks_path.exists():
+            acked.update(message_id for message_id, _ in self._read_log(acks_path, int))
+        if messages_path.exists():
+            for message, size in self._read_log(messages_path, json.loads):
+                self._next_id = max(self._next_id, message['id'] + 1)
+                if message['id'] not in acked:
+                    self._pending.append((message['id'], message['body'], size))
+        self._messages_file = open(messages_path, 'a', encoding='utf-8')
+        self._acks_file = open(acks_path, 'a', encoding='utf-8')
+        self._opened = True
+        if self._pending:
+            print(f"📦 Queue recovered {len(self._pending)} unacknowledged messages")
+        else:
+            self._compact()
+
+    @staticmethod
+    def _read_log(path, parse):
+        """Parse each complete line of a log into (record, size); a torn tail is cut off so appends start on a fresh line"""
+        records = []
+        good_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('unterminated line')
+                    records.append((parse(line), len(line)))
+                except ValueError:
+                    # Torn final write from a crash
+                    break
+                good_bytes += len(line)
+        if good_bytes < path.stat().st_size:
+            with open(path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return records
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        """Everything is acknowledged: start both logs afresh"""
+        self._messages_file.truncate(0)
+        self._acks_file.truncate(0)
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        expired = [message_id for message_id, (deadline, _, _) in self._inflight.items() if deadline <= now]
+        # Push back in reverse so the oldest expired message ends up first
+        for message_id in sorted(expired, reverse=True):
+            _, body, size = self._inflight.pop(message_id)
+            self._pending.appendleft((message_id, body, size))
+        self.stats['redelivered'] += len(expired)
+
+    def depth(self):
+        return len(self._pending) + len(self._inflight)
+
+    def publish(self, bodies):
+        """Append a batch of message bodies with a single write; returns the bytes written"""
+        with self._cond:
+            self._open()
+            if self.depth() + len(bodies) > self.max_depth:
+                raise QueueFull(f'Queue depth limit {self.max_depth} reached')
+            lines = []
+            for body in bodies:
+                line = json.dumps({'id': self._next_id, 'body': body}) + '\n'
+                self._pending.append((self._next_id, body, len(line)))
+                self._next_id += 1
+                lines.append(line)
+            payload = ''.join(lines)
+            self._messages_file.write(payload)
+            self._sync(self._messages_file)
+            self.stats['published'] += len(bodies)
+            self._cond.notify_all()
+        return len(payload)
+
+    def pull(self, max_messages, lease_seconds, wait_seconds=0.0):
+        """Lease up to max_messages, waiting up to wait_seconds for the first one"""
+        wait_until = time.monotonic() + wait_seconds
+        with self._cond:
+            self._open()
+            self._requeue_expired()
+            while not self._pending:
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+                self._requeue_expired()
+            lease_deadline = time.monotonic() + lease_seconds
+            batch = []
+            while self._pending and len(batch) < max_messages:
+                message_id, body, size = self._pending.popleft()
+                self._inflight[message_id] = (lease_deadline, body, size)
+                batch.append({'id': message_id, 'body': body, 'size': size})
+            self.stats['delivered'] += len(batch)
+            return batch
+
+    def ack(self, message_ids):
+        """Acknowledge leased messages; unknown or expired ids are ignored"""
+        with self._cond:
+            self._open()
+            acked = [message_id for message_id in message_ids if self._inflight.pop(message_id, None) is not None]
+            if acked:
+                self._acks_file.write(''.join(f"{message_id}\n" for message_id in acked))
+                self._sync(self._acks_file)
+                self.stats['acked'] += len(acked)
+            if not self._pending and not self._inflight:
+                self._compact()
+            return len(acked)
+
+    def snapshot(self):
+        with self._cond:
+            self._open()
+            return {
+                'depth': self.depth(),
+                'pending': len(self._pending),
+                'inflight': len(self._inflight),
+                'fsync': self.fsync,
+                'max_depth': self.max_depth,
+                **self.stats
+            }
+
+def _ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class ConsumerRing:
+    """Consistent-hash ring of consumer shards keyed on sensor_id, with health-aware failover.
+
+    Each shard owns `virtual_nodes` points on the ring, so adding a replica moves
+    only about 1/N of the sensors. A sensor belongs to the first shard clockwise
+    from its hash. A shard whose request fails is skipped for `retry_seconds` and
+    its sensors fall through to the next shard on the ring until it answers again.
+    """
+
+    def __init__(self, urls, virtual_nodes=SHARD_VIRTUAL_NODES, retry_seconds=SHARD_RETRY_SECONDS):
+        self.urls = list(urls)
+        self.retry_seconds = retry_seconds
+        points = sorted((_ring_hash(f"{url}#{i}"), url) for url in self.urls for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [url for _, url in points]
+        self._lock = threading.Lock()
+        self._health = {
+            url: {'healthy': True, 'down_until': 0.0, 'failures': 0, 'delivered': 0, 'last_error': None}
+            for url in self.urls
+        }
+
+    def owner(self, key):
+        """The shard that owns key, regardless of health"""
+        return self._owners[bisect.bisect(self._hashes, _ring_hash(key)) % len(self._owners)]
+
+    def failover_order(self, key):
+        """Available shards in ring order from key's owner; just the owner if none are available"""
+        start = bisect.bisect(self._hashes, _ring_hash(key))
+        now = time.monotonic()
+        order = []
+        for i in range(len(self._owners)):
+            url = self._owners[(start + i) % len(self._owners)]
+            if url in order:
+                continue
+            order.append(url)
+            if len(order) == len(self.urls):
+                break
+        available = [url for url in order if self._health[url]['healthy'] or self._health[url]['down_until'] <= now]
+        return available or order[:1]
+
+    def mark_success(self, url):
+        with self._lock:
+            health = self._health[url]
+            health['healthy'] = True
+            health['failures'] = 0
+            health['delivered'] += 1
+
+    def mark_failure(self, url, error):
+        with self._lock:
+            health = self._health[url]
+            health['healthy'] = False
+            health['down_until'] = time.monotonic() + self.retry_seconds
+            health['failures'] += 1
+            health['last_error'] = str(error)
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {'url': url, 'partition': shard_partition(url), **{k: v for k, v in self._health[url].items() if k != 'down_until'}}
+                for url in self.urls
+            ]
+
+def shard_partition(url):
+    """Queue partition name for a shard (its host:port)"""
+    return urlparse(url).netloc
+
+consumer_ring = ConsumerRing(CONSUMER_URLS)
+# One durable queue partition per shard keeps a sensor's readings on its shard under queue transport too
+message_queues = {
+    shard_partition(url): DurableQueue(Path(QUEUE_DIR) / shard_partition(url).replace(':', '_'), fsync=QUEUE_FSYNC)
+    for url in CONSUMER_URLS
 }
 
+def queue_for(sensor_id):
+    return message_queues[shard_partition(consumer_ring.owner(str(sensor_id)))]
+
+def publish_readings(readings, headers):
+    """Publish readings to their shards' queue partitions, one append per partition; returns bytes written"""
+    by_queue = {}
+    for reading in readings:
+        by_queue.setdefault(queue_for(reading.get('sensor_id', '')), []).append({'data': reading, 'trace': headers})
+    return sum(queue.publish(bodies) for queue, bodies in by_queue.items())
+
+def queue_snapshot():
+    partitions = {name: queue.snapshot() for name, queue in message_queues.items()}
+    return {
+        'depth': sum(p['depth'] for p in partitions.values()),
+        'partitions': partitions
+    }
+
+def post_to_shard(session, key, payload, headers):
+    """POST a payload to key's shard, failing over along the ring only when the shard could not be reached.
+
+    Other errors (a read timeout in particular) propagate without failover: the owner may
+    already have stored the readings, and only a retry to that same shard gets deduplicated.
+    """
+    last_error = None
+    for url in consumer_ring.failover_order(key):
+        try:
+            response = session.post(f"{url}/process-data", data=payload, headers=headers, timeout=5)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+            consumer_ring.mark_failure(url, e)
+            last_error = e
+            continue
+        consumer_ring.mark_success(url)
+        return response
+    raise last_error
+
+# Flow control: the producer probes for the consumers' sustainable throughput
+class FlowControlRejected(Exception):
+    pass
+
+def jittered_backoff(attempt, base_ms=RETRY_BASE_MS, cap_ms=RETRY_CAP_MS):
+    """Full-jitter exponential backoff in seconds for the given (1-based) attempt"""
+    return random.uniform(0, min(cap_ms, base_ms * 2 ** (attempt - 1))) / 1000.0
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() reserves tokens and sleeps until they are due.
+
+    The balance may go negative, which queues callers behind each other, so
+    several workers sharing a bucket add up to exactly `rate` per second.
+    A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(max(1, burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1, deadline=None, cancelled=None):
+        """Take tokens, sleeping until they are due.
+
+        Returns False without taking anything if they are due after `deadline`
+        (epoch seconds), and False early if `cancelled()` turns true while waiting.
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = (tokens - self._tokens) / self.rate if self._tokens < tokens else 0
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            self._tokens -= tokens
+        if cancelled is None:
+            if wait > 0:
+                time.sleep(wait)
+            return True
+        due = time.monotonic() + wait
+        while time.monotonic() < due:
+            if cancelled():
+                return False
+            time.sleep(max(0.0, min(due - time.monotonic(), 0.05)))
+        return not cancelled()
+
+class RetryBudget:
+    """Caps retries at `ratio` of requests, plus `min_per_second` so a trickle of traffic can still retry"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_MIN_PER_SECOND):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(1.0, min_per_second * 10)
+        self._balance = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            now = time.monotonic()
+            self._balance = min(self.capacity, self._balance + (now - self._updated) * self.min_per_second)
+            self._updated = now
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    def balance(self):
+        with self._lock:
+            return self._balance
+
+class AIMDLimiter:
+    """Concurrency limit adjusted by additive-increase / multiplicative-decrease.
+
+    Completions are judged in windows of about `limit` samples (roughly one
+    round trip). A window whose error rate exceeds `max_error_rate` or whose
+    mean latency exceeds `latency_target_ms` multiplies the limit by `backoff`.
+    Otherwise, if the limit was actually reached during the window, it grows
+    by one. Only requests started since the last decrease are judged, so the
+    stragglers of an overload do not cut the limit twice. Callers that find no
+    free slot within the acquire timeout are rejected.
+    """
+
+    def __init__(self, initial=FLOW_INITIAL_LIMIT, min_limit=FLOW_MIN_LIMIT, max_limit=FLOW_MAX_LIMIT,
+                 latency_target_ms=FLOW_LATENCY_TARGET_MS, max_error_rate=FLOW_MAX_ERROR_RATE, backoff=FLOW_BACKOFF_RATIO):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_target_ms = latency_target_ms
+        self.max_error_rate = max_error_rate
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        self.inflight = 0
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._window = {'samples': 0, 'errors': 0, 'latency_ms': 0.0, 'saturated': False}
+        self.last_window = None
+        self._epoch = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._cond:
+            self.stats = {'rejected': 0, 'increases': 0, 'decreases': 0, 'peak_limit': self.limit}
+
+    def acquire(self, timeout):
+        """Wait up to timeout for a slot; returns a ticket for release(), or None when rejected"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['rejected'] += 1
+                    return None
+                self._cond.wait(remaining)
+            self.inflight += 1
+            if self.inflight >= int(self.limit):
+                self._window['saturated'] = True
+            return self._epoch
+
+    def release(self, ticket, latency_ms, ok):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+            if ticket != self._epoch:
+                return
+            window = self._window
+            window['samples'] += 1
+            window['latency_ms'] += latency_ms
+            if not ok:
+                window['errors'] += 1
+            if window['samples'] >= max(1, int(self.limit)):
+                self._adjust(window)
+
+    def _adjust(self, window):
+        error_rate = window['errors'] / window['samples']
+        mean_latency = window['latency_ms'] / window['samples']
+        if error_rate > self.max_error_rate or mean_latency > self.latency_target_ms:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self.stats['decreases'] += 1
+            self._epoch += 1
+        elif window['saturated']:
+            self.limit = min(self.max_limit, self.limit + 1)
+            self.stats['increases'] += 1
+            self.stats['peak_limit'] = max(self.stats['peak_limit'], self.limit)
+        self.last_window = {'samples': window['samples'], 'error_rate': round(error_rate, 4), 'mean_latency_ms': round(mean_latency, 3)}
+        self._window = {'samples': 0, 'errors': 0, 'latency_ms': 0.0, 'saturated': self.inflight >= int(self.limit)}
+
+class FlowController:
+    """Sends through an AIMD concurrency limit, retrying failures with jittered backoff inside a retry budget"""
+
+    def __init__(self):
+        self.limiter = AIMDLimiter()
+        self.retry_budget = RetryBudget()
+        self.stats = {'requests': 0, 'retries': 0, 'retries_denied': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        self.limiter.reset_stats()
+        with self._lock:
+            self.stats = {'requests': 0, 'retries': 0, 'retries_denied': 0, 'errors': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def send(self, attempt):
+        """Call attempt() (returning a response) until it succeeds, is not retryable, or retries run out.
+
+        Connection errors, 429 and 5xx count as overload and are retried. Raises
+        FlowControlRejected when no concurrency slot frees up in time.
+        """
+        self._count('requests')
+        self.retry_budget.deposit()
+        retries = 0
+        while True:
+            ticket = self.limiter.acquire(FLOW_ACQUIRE_TIMEOUT)
+            if ticket is None:
+                raise FlowControlRejected(f'No send slot within {FLOW_ACQUIRE_TIMEOUT}s (limit {int(self.limiter.limit)})')
+            started = time.perf_counter()
+            response, error = None, None
+            try:
+                response = attempt()
+            except requests.exceptions.RequestException as e:
+                error = e
+            ok = error is None and response.status_code != 429 and response.status_code < 500
+            self.limiter.release(ticket, (time.perf_counter() - started) * 1000.0, ok)
+            if ok:
+                return response
+            self._count('errors')
+            if retries >= RETRY_MAX_ATTEMPTS:
+                break
+            if not self.retry_budget.try_withdraw():
+                self._count('retries_denied')
+                break
+            retries += 1
+            self._count('retries')
+            time.sleep(jittered_backoff(retries))
+        if error is not None:
+            raise error
+        return response
+
+    def snapshot(self):
+        limiter = self.limiter
+        return {
+            'limit': int(limiter.limit),
+            'inflight': limiter.inflight,
+            'min_limit': limiter.min_limit,
+            'max_limit': limiter.max_limit,
+            'latency_target_ms': limiter.latency_target_ms,
+            'max_error_rate': limiter.max_error_rate,
+            'last_window': limiter.last_window,
+            'retry_budget_balance': round(self.retry_budget.balance(), 2),
+            **limiter.stats,
+            **self.stats
+        }
+
+flow_controller = FlowController()
+
+def start_trace():
+    """Open a trace context for one reading; stage timings are monotonic, in ms."""
+    return {
+        'trace_id': uuid.uuid4().hex,
+        'span_id': uuid.uuid4().hex[:16],
+        'generated_at': time.time(),
+        'stages': {}
+    }
+
+def record_stage(trace, stage, started):
+    """Record the elapsed time since `started` (a perf_counter value) for a stage."""
+    if trace is not None:
+        trace['stages'][stage] = round((time.perf_counter() - started) * 1000.0, 4)
+
+def trace_headers(trace):
+    """Build the HTTP headers that propagate a trace context to the consumer."""
+    return {
+        'X-Trace-Id': trace['trace_id'],
+        'X-Span-Id': trace['span_id'],
+        'X-Trace-Generated-At': repr(trace['generated_at']),
+        'X-Trace-Sent-At': repr(time.time()),
+        'X-Trace-Stages': ';'.join(f"{k}={v}" for k, v in trace['stages'].items())
+    }
+
+def generate_traced_sensor_data():
+    """Generate a reading together with a trace context covering its generation."""
+    trace = start_trace()
+    started = time.perf_counter()
+    data = generate_sensor_data()
+    record_stage(trace, 'generate', started)
+    return data, trace
+
+# Sampling profiler
+PROFILE_MAX_SECONDS = 120
+PROFILE_MAX_HZ = 1000
+profile_stop = threading.Event()  # set by /admin/profile/stop to end a running capture early
+
+def sample_thread_stacks(seconds, hz):
+    """Sample every other thread's stack at `hz` for `seconds`; returns ({collapsed stack: count}, samples)"""
+    interval = 1.0 / hz
+    own_ident = threading.get_ident()
+    counts = {}
+    samples = 0
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time and not profile_stop.is_set():
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f"thread-{ident}"))
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        samples += 1
+        time.sleep(interval)
+    return counts, samples
+
+def to_speedscope(counts, hz, name):
+    """Convert collapsed stack counts into a speedscope 'sampled' profile document"""
+    frame_index = {}
+    frames = []
+    samples = []
+    weights = []
+    for stack, count in counts.items():
+        indices = []
+        for frame_name in stack.split(';'):
+            if frame_name not in frame_index:
+                frame_index[frame_name] = len(frames)
+                frames.append({'name': frame_name})
+            indices.append(frame_index[frame_name])
+        samples.append(indices)
+        weights.append(count / hz)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights
+        }],
+        'name': name,
+        'exporter': 'mssandbox'
+    }
+
+# Sensor fleet simulation
+class SensorFleet:
+    """A fleet of simulated sensors producing readings in vectorized batches.
+
+    Every sensor has its own baseline, daily-cycle phase and reporting weight.
+    The weights are lognormal with sigma `rate_skew`, so a few sensors report
+    far more often than most. Each sensor's offset from its baseline drifts as
+    an Ornstein-Uhlenbeck process with time constant `drift_tau`, advanced by
+    the wall-clock time since that sensor last reported, and every reading adds
+    measurement noise. Channels are ordered (temperature, humidity, pressure).
+    """
+
+    DRIFT_SIGMA = np.array([1.0, 3.0, 1.5])
+    NOISE_SIGMA = np.array([0.1, 0.5, 0.2])
+    DAILY_AMPLITUDE = np.array([2.0, -5.0, 0.5])
+
+    def __init__(self, size=SIM_FLEET_SIZE, rate_skew=SIM_RATE_SKEW, drift_tau=SIM_DRIFT_TAU_SECONDS, seed=SIM_SEED):
+        self.size = max(1, int(size))
+        self.rate_skew = max(0.0, float(rate_skew))
+        self.drift_tau = max(1.0, float(drift_tau))
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        rng = self._rng
+        self._ids = [f"SENSOR_{i:06d}" for i in range(self.size)]
+        self._base = np.stack([
+            rng.uniform(18.0, 25.0, self.size),
+            rng.uniform(40.0, 80.0, self.size),
+            rng.uniform(1000.0, 1020.0, self.size)
+        ])
+        self._phase = rng.uniform(0, 2 * np.pi, self.size)
+        self._drift = rng.standard_normal((3, self.size)) * self.DRIFT_SIGMA[:, None]
+        self._last_update = np.full(self.size, time.time())
+        weights = rng.lognormal(0.0, self.rate_skew, self.size) if self.rate_skew > 0 else np.ones(self.size)
+        self._weights = weights / weights.sum()
+        self._cumulative = np.cumsum(self._weights)
+        self._reports = np.zeros(self.size, dtype=np.int64)
+        self.generated = 0
+
+    def sample(self, n):
+        """Draw n readings, picking sensors in proportion to their reporting rates"""
+        n = max(1, int(n))
+        now = time.time()
+        with self._lock:
+            rng = self._rng
+            idx = np.searchsorted(self._cumulative, rng.random(n) * self._cumulative[-1], side='right')
+            np.minimum(idx, self.size - 1, out=idx)
+            decay = np.exp(-(now - self._last_update[idx]) / self.drift_tau)
+            self._drift[:, idx] = (self._drift[:, idx] * decay
+                                   + self.DRIFT_SIGMA[:, None] * np.sqrt(1.0 - decay ** 2) * rng.standard_normal((3, n)))
+            self._last_update[idx] = now
+            drift = self._drift[:, idx]
+            noise = rng.standard_normal((3, n)) * self.NOISE_SIGMA[:, None]
+            np.add.at(self._reports, idx, 1)
+            self.generated += n
+        daily = np.sin(2 * np.pi * (now % 86400) / 86400 + self._phase[idx])
+        values = self._base[:, idx] + self.DAILY_AMPLITUDE[:, None] * daily + drift + noise
+        values[1] = np.clip(values[1], 0.0, 100.0)
+        values = np.round(values, 2).tolist()
+        timestamp = datetime.now().isoformat()
+        ids = self._ids
+        first_seq = allocate_sequence(n)
+        return [
+            {'timestamp': timestamp, 'temperature': t, 'humidity': h, 'pressure': p, 'sensor_id': ids[i], 'seq': first_seq + k}
+            for k, (i, t, h, p) in enumerate(zip(idx.tolist(), values[0], values[1], values[2]))
+        ]
+
+    def snapshot(self, aggregate_rate=None):
+        """Fleet shape and how the readings generated so far spread over sensors"""
+        with self._lock:
+            reports = self._reports.copy()
+            generated = self.generated
+        top_decile = np.sort(self._weights)[-max(1, self.size // 10):].sum()
+        result = {
+            'size': self.size,
+            'rate_skew': self.rate_skew,
+            'drift_tau_seconds': self.drift_tau,
+            'generated': generated,
+            'sensors_reported': int(np.count_nonzero(reports)),
+            'max_reports_per_sensor': int(reports.max()),
+            'top_10pct_rate_share': round(float(top_decile), 4)
+        }
+        if aggregate_rate:
+            # Expected per-sensor reporting rates at the given aggregate readings/s
+            rates = self._weights * aggregate_rate
+            result['per_sensor_rate_hz'] = {
+                'min': float(rates.min()),
+                'median': float(np.median(rates)),
+                'p99': float(np.percentile(rates, 99)),
+                'max': float(rates.max())
+            }
+        return result
+
+sensor_fleet = None
+sensor_fleet_lock = threading.Lock()
+
+def get_sensor_fleet(size=SIM_FLEET_SIZE, rate_skew=SIM_RATE_SKEW):
+    """Return the shared fleet, rebuilding it when the requested shape changes"""
+    global sensor_fleet
+    with sensor_fleet_lock:
+        if sensor_fleet is None or sensor_fleet.size != int(size) or sensor_fleet.rate_skew != float(rate_skew):
+            sensor_fleet = SensorFleet(size, rate_skew)
+            print(f"🛰️ Sensor fleet ready: {sensor_fleet.size} sensors, rate skew {sensor_fleet.rate_skew}")
+        return sensor_fleet
+
 def _approximate_payload_of_size(base_data, target_bytes):
     """Return a data dict whose JSON body is roughly target_bytes in size."""
     try:
@@ -52,29 +793,90 @@ def _approximate_payload_of_size(base_data, target_bytes):
     except Exception:
         return base_data
 
-def _benchmark_worker(end_time):
+def _benchmark_worker(end_time, bucket):
+    """Send readings until end_time; the shared token bucket paces batches (not shard requests) across workers"""
     global benchmark_stats, benchmark_running
     session = requests.Session()
+    batch_size = benchmark_config.get('batch_size', 1)
+    transport = benchmark_config.get('transport', 'http')
+    use_flow_control = benchmark_config.get('flow_control', True)
+    fleet = get_sensor_fleet(benchmark_config['fleet_size'], benchmark_config['rate_skew']) if benchmark_config.get('source') == 'fleet' else None
+    consecutive_failures = 0
     while benchmark_running and time.time() < end_time:
+        if not bucket.acquire(deadline=end_time, cancelled=lambda: not benchmark_running):
+            # Stopped while waiting, or no token is due before the end: then idle out the run
+            # so elapsed time still covers the full duration
+            while benchmark_running and time.time() < end_time:
+                time.sleep(0.05)
+            break
         try:
-            data = generate_sensor_data()
-            # Apply payload size padding if configured
             target = max(0, int(benchmark_config.get('payload_bytes', 0)))
-            if target > 0:
-                data = _approximate_payload_of_size(data, target)
-            payload = json.dumps(data)
-            headers = {'Content-Type': 'application/json'}
-            benchmark_stats['attempted'] += 1
-            resp = session.post(f"{CONSUMER_URL}/process-data", data=payload, headers=headers, timeout=5)
-            if resp.status_code == 200:
-                benchmark_stats['succeeded'] += 1
-                benchmark_stats['bytes_sent'] += len(payload.encode('utf-8'))
+            if fleet is not None:
+                # The whole batch comes from one vectorized draw over the fleet
+                trace = start_trace()
+                started = time.perf_counter()
+                data = fleet.sample(batch_size)
+                record_stage(trace, 'generate', started)
+                if target > 0:
+                    data = [_approximate_payload_of_size(reading, target) for reading in data]
+                if batch_size == 1:
+                    data = data[0]
             else:
-                benchmark_stats['failed'] += 1
+                data, trace = generate_traced_sensor_data()
+                # Apply payload size padding if configured
+                if target > 0:
+                    data = _approximate_payload_of_size(data, target)
+            if fleet is None and batch_size > 1:
+                # One request carries batch_size readings; payload size applies per reading
+                data = [data] + [
+                    _approximate_payload_of_size(generate_sensor_data(), target) if target > 0 else generate_sensor_data()
+                    for _ in range(batch_size - 1)
+                ]
+            readings = data if isinstance(data, list) else [data]
+            if transport == 'queue':
+                # Publish the batch with one append per partition; each reading becomes its own message
+                benchmark_stats['attempted'] += 1
+                written = publish_readings(readings, trace_headers(trace))
+                benchmark_stats['succeeded'] += 1
+                benchmark_stats['bytes_sent'] += written
+                benchmark_stats['readings_sent'] += batch_size
+                consecutive_failures = 0
+                continue
+            # Split the batch by owning shard so each sensor's readings stay on one consumer
+            groups = {}
+            for reading in readings:
+                groups.setdefault(consumer_ring.owner(reading['sensor_id']), []).append(reading)
+            for group in groups.values():
+                started = time.perf_counter()
+                payload = json.dumps(group if isinstance(data, list) else group[0])
+                record_stage(trace, 'serialize', started)
+                key = group[0]['sensor_id']
+
+                def attempt():
+                    headers = {'Content-Type': 'application/json'}
+                    headers.update(trace_headers(trace))
+                    return post_to_shard(session, key, payload, headers)
+
+                benchmark_stats['attempted'] += 1
+                try:
+                    resp = flow_controller.send(attempt) if use_flow_control else attempt()
+                except FlowControlRejected:
+                    benchmark_stats['rejected'] += 1
+                    continue
+                if resp.status_code == 200:
+                    benchmark_stats['succeeded'] += 1
+                    benchmark_stats['bytes_sent'] += len(payload.encode('utf-8'))
+                    benchmark_stats['readings_sent'] += len(group)
+                    consecutive_failures = 0
+                else:
+                    benchmark_stats['failed'] += 1
+                    consecutive_failures += 1
         except Exception:
             benchmark_stats['failed'] += 1
-            # small backoff to avoid tight error loops
-            time.sleep(0.001)
+            consecutive_failures += 1
+        if consecutive_failures:
+            # Back off harder while the consumer (or a full queue) keeps failing
+            time.sleep(jittered_backoff(consecutive_failures))
 
 def _reset_benchmark_stats():
     global benchmark_stats
@@ -84,25 +886,46 @@ def _reset_benchmark_stats():
         'attempted': 0,
         'succeeded': 0,
         'failed': 0,
-        'bytes_sent': 0
+        'rejected': 0,
+        'bytes_sent': 0,
+        'readings_sent': 0
     }
 
-def start_benchmark(duration_seconds: int, payload_bytes: int, workers: int):
+def start_benchmark(duration_seconds: int, payload_bytes: int, workers: int, batch_size: int = 1, target_rps: float = 0, transport: str = 'http', flow_control: bool = True,
+                    source: str = 'random', fleet_size: int = SIM_FLEET_SIZE, rate_skew: float = SIM_RATE_SKEW):
     global benchmark_running, benchmark_thread, benchmark_config
     if benchmark_running:
         return False
+    if transport not in TRANSPORTS:
+        raise ValueError(f'Unknown transport: {transport}')
+    if source not in SOURCES:
+        raise ValueError(f'Unknown source: {source}')
     benchmark_config = {
         'duration_seconds': max(1, int(duration_seconds)),
         'payload_bytes': max(0, int(payload_bytes)),
-        'workers': max(1, int(workers))
+        'workers': max(1, int(workers)),
+        'batch_size': max(1, int(batch_size)),
+        'target_rps': max(0.0, float(target_rps)),
+        'transport': transport,
+        'flow_control': bool(flow_control),
+        'source': source
     }
+    if source == 'fleet':
+        benchmark_config['fleet_size'] = max(1, int(fleet_size))
+        benchmark_config['rate_skew'] = max(0.0, float(rate_skew))
+        # Build (or reuse) the fleet before the clock starts
+        get_sensor_fleet(benchmark_config['fleet_size'], benchmark_config['rate_skew'])
     _reset_benchmark_stats()
+    # Counters are per run; the learned limit carries over (e.g. from a warmup phase)
+    flow_controller.reset_stats()
     benchmark_running = True
     end_time = time.time() + benchmark_config['duration_seconds']
+    # One bucket shared by all workers caps the aggregate batch rate (0 = as fast as possible)
+    bucket = TokenBucket(benchmark_config['target_rps'])
     # Launch worker threads
     threads = []
     for _ in range(benchmark_config['workers']):
-        t = threading.Thread(target=_benchmark_worker, args=(end_time,), daemon=True)
+        t = threading.Thread(target=_benchmark_worker, args=(end_time, bucket), daemon=True)
         t.start()
         threads.append(t)
 
@@ -129,48 +952,74 @@ def generate_sensor_data():
         'temperature': round(random.uniform(18.0, 25.0), 2),
         'humidity': round(random.uniform(40.0, 80.0), 2),
         'pressure': round(random.uniform(1000.0, 1020.0), 2),
-        'sensor_id': f"SENSOR_{random.randint(1000, 9999)}"
+        'sensor_id': f"SENSOR_{random.randint(1000, 9999)}",
+        'seq': allocate_sequence()
     }
 
-def send_data_to_consumer(data):
-    """Send data to consumer service"""
+def send_data_to_consumer(data, trace=None):
+    """Send data to consumer service, propagating the reading's trace context"""
+    if trace is None:
+        trace = start_trace()
+    if TRANSPORT == 'queue':
+        return publish_to_queue(data, trace)
     try:
-        response = requests.post(
-            f"{CONSUMER_URL}/process-data",
-            json=data,
-            headers={'Content-Type': 'application/json'},
-            timeout=5
-        )
+        started = time.perf_counter()
+        payload = json.dumps(data)
+        record_stage(trace, 'serialize', started)
+
+        def attempt():
+            headers = {'Content-Type': 'application/json'}
+            headers.update(trace_headers(trace))
+            return post_to_shard(requests, data['sensor_id'], payload, headers)
+
+        response = flow_controller.send(attempt)
         return response.json() if response.status_code == 200 else None
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, FlowControlRejected) as e:
         print(f"Error sending data to consumer: {e}")
         return None
 
+def publish_to_queue(data, trace):
+    """Queue a reading for the consumer to pull"""
+    try:
+        publish_readings([data], trace_headers(trace))
+        return {'message': 'Data queued for consumer', 'queue_depth': queue_snapshot()['depth']}
+    except (QueueFull, OSError) as e:
+        print(f"Error queueing data for consumer: {e}")
+        return None
+
 def automation_worker():
     """Background worker for automated data generation and sending"""
     global automation_running, last_generated_data
     
+    bucket = TokenBucket(1.0 / automation_interval)
+    consecutive_failures = 0
     while automation_running:
+        # Paced by a token bucket rather than a sleep after each send, so slow sends don't stretch the cycle
+        bucket.acquire()
+        if not automation_running:
+            break
         try:
             # Generate new data
-            data = generate_sensor_data()
+            data, trace = generate_traced_sensor_data()
             last_generated_data = data
             
-            print(f"🤖 Automated: Generated data for sensor {data['sensor_id']}")
+            print(f"🤖 Automated: Generated data for sensor {data['sensor_id']} (trace {trace['trace_id']})")
             
             # Send to consumer
-            result = send_data_to_consumer(data)
+            result = send_data_to_consumer(data, trace)
             if result:
                 print(f"✅ Automated: Data sent to consumer successfully")
+                consecutive_failures = 0
             else:
                 print(f"❌ Automated: Failed to send data to consumer")
-            
-            # Wait for next cycle
-            time.sleep(automation_interval)
+                consecutive_failures += 1
             
         except Exception as e:
             print(f"❌ Automation error: {e}")
-            time.sleep(automation_interval)
+            consecutive_failures += 1
+        if consecutive_failures:
+            # Give a struggling consumer extra room on top of the regular cadence
+            time.sleep(jittered_backoff(consecutive_failures, cap_ms=automation_interval * 1000))
 
 def start_automation():
     """Start the automated data generation"""
@@ -211,6 +1060,15 @@ def home():
             'start_automation': '/start-automation',
             'stop_automation': '/stop-automation',
             'automation_status': '/automation-status',
+            'profile': '/admin/profile',
+            'profile_stop': '/admin/profile/stop',
+            'queue_pull': '/queue/pull',
+            'queue_ack': '/queue/ack',
+            'queue_stats': '/queue/stats',
+            'shards': '/shards',
+            'flow_control': '/flow-control',
+            'simulation_start': '/simulation/start',
+            'simulation_status': '/simulation/status',
             'status': '/status'
         }
     })
@@ -287,6 +1145,11 @@ def status():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'consumer_url': CONSUMER_URL,
+        'consumer_urls': CONSUMER_URLS,
+        'shards': consumer_ring.snapshot(),
+        'transport': TRANSPORT,
+        'queue_depth': queue_snapshot()['depth'],
+        'flow_control_limit': int(flow_controller.limiter.limit),
         'automation_running': automation_running,
         'last_data_sensor_id': last_generated_data['sensor_id'] if last_generated_data else None,
         'benchmark_running': benchmark_running
@@ -326,7 +1189,14 @@ def benchmark_start():
         duration = int(payload.get('duration_seconds', 10))
         size_bytes = int(payload.get('payload_bytes', 0))
         workers = int(payload.get('workers', 1))
-        started = start_benchmark(duration, size_bytes, workers)
+        batch_size = int(payload.get('batch_size', 1))
+        target_rps = float(payload.get('target_rps', 0))
+        transport = payload.get('transport', 'http')
+        flow_control = bool(payload.get('flow_control', True))
+        source = payload.get('source', 'random')
+        fleet_size = int(payload.get('fleet_size', SIM_FLEET_SIZE))
+        rate_skew = float(payload.get('rate_skew', SIM_RATE_SKEW))
+        started = start_benchmark(duration, size_bytes, workers, batch_size, target_rps, transport, flow_control, source, fleet_size, rate_skew)
         return jsonify({
             'started': started,
             'running': benchmark_running,
@@ -341,12 +1211,12 @@ def benchmark_stop():
     stop_benchmark()
     return jsonify({
         'running': benchmark_running,
+        'config': benchmark_config,
         'stats': benchmark_stats
     })
 
-@app.route('/benchmark/status')
-def benchmark_status():
-    # add elapsed seconds and throughput estimates
+def _benchmark_throughput():
+    """Elapsed seconds of the current/last run and its throughput estimates"""
     elapsed = None
     try:
         if benchmark_stats['started_at']:
@@ -357,18 +1227,165 @@ def benchmark_status():
         elapsed = None
     rps = (benchmark_stats['succeeded'] / elapsed) if elapsed and elapsed > 0 else None
     bps = (benchmark_stats['bytes_sent'] / elapsed) if elapsed and elapsed > 0 else None
+    readings_ps = (benchmark_stats['readings_sent'] / elapsed) if elapsed and elapsed > 0 else None
+    return elapsed, {
+        'requests_per_second': rps,
+        'readings_per_second': readings_ps,
+        'bytes_per_second': bps
+    }
+
+@app.route('/benchmark/status')
+def benchmark_status():
+    elapsed, throughput = _benchmark_throughput()
     return jsonify({
         'running': benchmark_running,
         'config': benchmark_config,
         'stats': benchmark_stats,
+        'queue': queue_snapshot(),
+        'flow_control': flow_controller.snapshot(),
+        'fleet': sensor_fleet.snapshot() if benchmark_config.get('source') == 'fleet' and sensor_fleet else None,
         'elapsed_seconds': elapsed,
-        'throughput': {
-            'requests_per_second': rps,
-            'bytes_per_second': bps
+        'throughput': throughput
+    })
+
+# Profiling endpoint
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample all threads for a while and return collapsed stacks or a speedscope file"""
+    try:
+        seconds = min(PROFILE_MAX_SECONDS, max(0.1, float(request.args.get('seconds', 5))))
+        hz = min(PROFILE_MAX_HZ, max(1, int(request.args.get('hz', 100))))
+        fmt = request.args.get('format', 'speedscope')
+        if fmt not in ('speedscope', 'collapsed'):
+            return jsonify({'error': f'Unknown profile format: {fmt}'}), 400
+        profile_stop.clear()
+        counts, samples = sample_thread_stacks(seconds, hz)
+        print(f"🔬 Profile captured: {samples} samples over {seconds}s at {hz} Hz")
+        if fmt == 'collapsed':
+            body = ''.join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+            return Response(body, mimetype='text/plain')
+        return jsonify(to_speedscope(counts, hz, f"{SERVICE_NAME} ({seconds}s @ {hz} Hz)"))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/admin/profile/stop')
+def admin_profile_stop():
+    """End a running profile capture early; it returns the samples taken so far"""
+    profile_stop.set()
+    return jsonify({'stopped': True})
+
+# Queue transport endpoints (consumer pulls and acknowledges)
+def _requested_queue():
+    """The queue partition named by ?partition=, or the only one when there is a single shard"""
+    name = request.args.get('partition')
+    if not name and len(message_queues) == 1:
+        return next(iter(message_queues.values()))
+    return message_queues.get(name)
+
+@app.route('/queue/pull')
+def queue_pull():
+    """Lease up to `max` messages; long-polls up to `wait_seconds` when the queue is empty"""
+    queue = _requested_queue()
+    if queue is None:
+        return jsonify({'error': f"Unknown queue partition: {request.args.get('partition')}", 'partitions': list(message_queues)}), 404
+    try:
+        max_messages = max(1, int(request.args.get('max', 100)))
+        lease_seconds = max(0.1, float(request.args.get('lease_seconds', 30)))
+        wait_seconds = min(30.0, max(0.0, float(request.args.get('wait_seconds', 0))))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'messages': queue.pull(max_messages, lease_seconds, wait_seconds)})
+
+@app.route('/queue/ack', methods=['POST'])
+def queue_ack():
+    """Acknowledge processed messages: {"ids": [...]}"""
+    queue = _requested_queue()
+    if queue is None:
+        return jsonify({'error': f"Unknown queue partition: {request.args.get('partition')}", 'partitions': list(message_queues)}), 404
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids', [])
+    if not isinstance(ids, list):
+        return jsonify({'error': 'ids must be a list'}), 400
+    acked = queue.ack(ids)
+    return jsonify({'acked': acked, 'depth': queue.snapshot()['depth']})
+
+@app.route('/queue/stats')
+def queue_stats():
+    return jsonify({**queue_snapshot(), 'transport': TRANSPORT, 'timestamp': datetime.now().isoformat()})
+
+@app.route('/shards')
+def shards():
+    """Consumer shards with their health and delivery counters; ?sensor_id= also resolves its route"""
+    sensor_id = request.args.get('sensor_id')
+    route = None
+    if sensor_id:
+        route = {
+            'sensor_id': sensor_id,
+            'owner': consumer_ring.owner(sensor_id),
+            'failover_order': consumer_ring.failover_order(sensor_id)
         }
+    return jsonify({
+        'shards': consumer_ring.snapshot(),
+        'route': route,
+        'virtual_nodes': SHARD_VIRTUAL_NODES,
+        'retry_seconds': SHARD_RETRY_SECONDS,
+        'timestamp': datetime.now().isoformat()
     })
 
+# Fleet simulation: a benchmark with source 'fleet', configured by aggregate readings/s
+@app.route('/simulation/start', methods=['POST'])
+def simulation_start():
+    """Drive the sender from the sensor fleet at `rate` readings/s in batches of `batch_size`"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        rate = float(payload.get('rate', 1000))
+        batch_size = max(1, int(payload.get('batch_size', 100)))
+        started = start_benchmark(
+            int(payload.get('duration_seconds', 60)),
+            int(payload.get('payload_bytes', 0)),
+            int(payload.get('workers', 4)),
+            batch_size,
+            rate / batch_size if rate > 0 else 0,
+            payload.get('transport', TRANSPORT),
+            bool(payload.get('flow_control', True)),
+            'fleet',
+            int(payload.get('fleet_size', SIM_FLEET_SIZE)),
+            float(payload.get('rate_skew', SIM_RATE_SKEW))
+        )
+        return jsonify({
+            'started': started,
+            'running': benchmark_running,
+            'config': benchmark_config,
+            'target_readings_per_second': rate,
+            'fleet': sensor_fleet.snapshot(rate) if started else None
+        }), (200 if started else 409)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/simulation/status')
+def simulation_status():
+    """Fleet shape and report spread, plus achieved vs. target aggregate rate"""
+    if sensor_fleet is None:
+        return jsonify({'error': 'No sensor fleet has been built yet'}), 404
+    target = benchmark_config['target_rps'] * benchmark_config['batch_size'] if benchmark_config.get('source') == 'fleet' else None
+    _, throughput = _benchmark_throughput()
+    return jsonify({
+        'running': benchmark_running and benchmark_config.get('source') == 'fleet',
+        'config': benchmark_config,
+        'target_readings_per_second': target,
+        'readings_per_second': throughput['readings_per_second'],
+        'stats': benchmark_stats,
+        'fleet': sensor_fleet.snapshot(target),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/flow-control')
+def flow_control():
+    """Current adaptive concurrency limit, rejection and retry counters"""
+    return jsonify({**flow_controller.snapshot(), 'timestamp': datetime.now().isoformat()})
+
 if __name__ == '__main__':
     print(f"PRODUCER SERVICE STARTED on port {SERVICE_PORT}")
-    print(f"Consumer URL: {CONSUMER_URL}")
+    print(f"Consumer shards: {', '.join(CONSUMER_URLS)}")
+    print(f"Transport: {TRANSPORT} (queue dir: {QUEUE_DIR})")
     app.run(host='0.0.0.0', port=SERVICE_PORT, debug=True)
@@ -0,0 +1,39 @@
+"""Crash recovery of the web UI's indexed benchmark log."""
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_webui():
+    spec = importlib.util.spec_from_file_location('webui_app', ROOT / 'webui' / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+BenchmarkLogStore = load_webui().BenchmarkLogStore
+
+
+def record(n):
+    return {'timestamp': f'2026-01-01T00:00:{n:02d}', 'producer': {'config': {'workers': n}}}
+
+
+def workers(store):
+    return sorted(r['producer']['config']['workers'] for r in store.query(n=100))
+
+
+def test_torn_write_is_truncated_before_the_next_append(tmp_path):
+    path = tmp_path / 'bench.jsonl'
+    store = BenchmarkLogStore(path)
+    for n in range(5):
+        store.append(record(n))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"timestamp": "2026-01-01T00:00:05", "produ')  # crash mid-write
+
+    store = BenchmarkLogStore(path)
+    store.append(record(6))
+    assert workers(store) == [0, 1, 2, 3, 4, 6]
+
+    Path(f'{path}.idx').unlink()
+    assert workers(BenchmarkLogStore(path)) == [0, 1, 2, 3, 4, 6]
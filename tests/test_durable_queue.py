@@ -0,0 +1,68 @@
+"""Crash recovery of the producer's on-disk queue."""
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_producer():
+    spec = importlib.util.spec_from_file_location('producer_app', ROOT / 'producer' / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+DurableQueue = load_producer().DurableQueue
+
+
+def pending_bodies(directory):
+    return [message['body'] for message in DurableQueue(directory).pull(100, lease_seconds=30)]
+
+
+def test_restart_recovers_unacknowledged_messages(tmp_path):
+    queue = DurableQueue(tmp_path)
+    queue.publish([{'n': 1}, {'n': 2}, {'n': 3}])
+    queue.ack([message['id'] for message in queue.pull(1, lease_seconds=30)])
+
+    assert pending_bodies(tmp_path) == [{'n': 2}, {'n': 3}]
+
+
+def test_torn_write_is_truncated_before_new_publishes(tmp_path):
+    DurableQueue(tmp_path).publish([{'n': 1}, {'n': 2}])
+    with open(tmp_path / 'messages.log', 'a', encoding='utf-8') as f:
+        f.write('{"id": 3, "body": {"n"')  # crash mid-write
+
+    DurableQueue(tmp_path).publish([{'n': 3}, {'n': 4}])
+
+    assert pending_bodies(tmp_path) == [{'n': 1}, {'n': 2}, {'n': 3}, {'n': 4}]
+
+
+def test_complete_record_without_newline_counts_as_torn(tmp_path):
+    DurableQueue(tmp_path).publish([{'n': 1}])
+    with open(tmp_path / 'messages.log', 'a', encoding='utf-8') as f:
+        f.write('{"id": 2, "body": {"n": 2}}')
+
+    queue = DurableQueue(tmp_path)
+    queue.publish([{'n': 3}])
+
+    messages = queue.pull(100, lease_seconds=30)
+    assert [message['body'] for message in messages] == [{'n': 1}, {'n': 3}]
+    assert [message['id'] for message in messages] == [1, 2]
+    assert pending_bodies(tmp_path) == [{'n': 1}, {'n': 3}]
+
+
+def test_torn_ack_is_truncated_and_not_counted(tmp_path):
+    queue = DurableQueue(tmp_path)
+    queue.publish([{'n': n} for n in range(1, 14)])
+    queue.pull(100, lease_seconds=30)
+    queue.ack([2])
+    with open(tmp_path / 'acks.log', 'a', encoding='utf-8') as f:
+        f.write('1')  # crash while writing "12\n"
+
+    queue = DurableQueue(tmp_path)
+    messages = queue.pull(100, lease_seconds=30)
+    assert [message['id'] for message in messages] == [1] + list(range(3, 14))
+    queue.ack([13])
+
+    assert (tmp_path / 'acks.log').read_text(encoding='utf-8') == '2\n13\n'
+    assert pending_bodies(tmp_path) == [{'n': n} for n in [1] + list(range(3, 13))]
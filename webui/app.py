@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import os
 import json
+import hashlib
+import time
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from flask import Flask, render_template, jsonify, request, redirect, url_for
+import yaml
+from flask import Flask, Response, render_template, jsonify, request, redirect, url_for, send_from_directory
 from datetime import datetime
 from pathlib import Path
 
@@ -12,6 +18,8 @@ app = Flask(__name__)
 SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8000))
 PRODUCER_URL = os.getenv('PRODUCER_URL', 'http://producer:8001')
 CONSUMER_URL = os.getenv('CONSUMER_URL', 'http://consumer:8002')
+# Consumer shards (same list as the producer's CONSUMER_URLS); CONSUMER_URL stays the single-shard default
+CONSUMER_URLS = [url.strip().rstrip('/') for url in os.getenv('CONSUMER_URLS', CONSUMER_URL).split(',') if url.strip()]
 
 # Benchmark log file (JSON Lines) inside the container filesystem
 BENCHMARK_LOG_PATH = os.getenv('BENCHMARK_LOG_PATH', str(Path(__file__).parent / 'benchmark_results.jsonl'))
@@ -22,15 +30,508 @@ try:
 except Exception as e:
     print(f"Failed to ensure benchmark log directory exists: {e}")
 
+# Fields kept in the offset index so listing/filtering never has to parse full records
+INDEXED_CONFIG_FIELDS = ('duration_seconds', 'payload_bytes', 'workers', 'batch_size', 'target_rps', 'transport', 'source')
+
+def _index_entry(record, offset, length):
+    config = (record.get('producer') or {}).get('config') or {}
+    return {
+        'offset': offset,
+        'length': length,
+        'timestamp': record.get('timestamp'),
+        'scenario': (record.get('scenario') or {}).get('name'),
+        'config': {k: config.get(k) for k in INDEXED_CONFIG_FIELDS if k in config}
+    }
+
+class BenchmarkLogStore:
+    """Append-only JSONL benchmark log with a sidecar byte-offset index.
+
+    The index (<log>.idx, one JSON entry per record) holds each record's offset,
+    length, timestamp and config, so tail reads and filters touch only the rows
+    they return. A stale or missing index is caught up from the log on first use.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index_path = Path(f"{path}.idx")
+        self._lock = threading.Lock()
+        self._entries = None
+        self._log_file = None
+        self._index_file = None
+
+    def _load_index(self):
+        entries = []
+        index_torn = False
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        index_torn = True
+                        break
+        log_size = self.path.stat().st_size if self.path.exists() else 0
+        indexed_end = entries[-1]['offset'] + entries[-1]['length'] if entries else 0
+        if indexed_end > log_size:
+            # Log was truncated or replaced: the index is no longer trustworthy
+            entries, indexed_end = [], 0
+        rewrite = not self.index_path.exists() or indexed_end == 0 or index_torn
+        if indexed_end < log_size:
+            with open(self.path, 'rb') as f:
+                f.seek(indexed_end)
+                offset = indexed_end
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        # Torn final write from a crash
+                        break
+                    try:
+                        entries.append(_index_entry(json.loads(raw), offset, len(raw)))
+                    except ValueError:
+                        pass
+                    offset += len(raw)
+            if offset < log_size:
+                # Cut the torn fragment off so the next append starts on a line of its own
+                with open(self.path, 'r+b') as f:
+                    f.truncate(offset)
+            rewrite = True
+        if rewrite:
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry) + '\n' for entry in entries)
+        self._entries = entries
+
+    def _ensure_open(self):
+        if self._entries is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+        if self._log_file is None:
+            self._log_file = open(self.path, 'ab')
+            self._index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def append(self, record):
+        raw = (json.dumps(record) + '\n').encode('utf-8')
+        with self._lock:
+            self._ensure_open()
+            offset = self._log_file.seek(0, os.SEEK_END)
+            self._log_file.write(raw)
+            self._log_file.flush()
+            entry = _index_entry(record, offset, len(raw))
+            self._index_file.write(json.dumps(entry) + '\n')
+            self._index_file.flush()
+            self._entries.append(entry)
+        return len(self._entries) - 1
+
+    def _read(self, positions):
+        records = []
+        with open(self.path, 'rb') as f:
+            for position in positions:
+                entry = self._entries[position]
+                f.seek(entry['offset'])
+                try:
+                    record = json.loads(f.read(entry['length']))
+                except ValueError:
+                    continue
+                record['id'] = position
+                records.append(record)
+        return records
+
+    def query(self, n=10, filters=None, since=None, until=None):
+        """Return the last n records matching config filters and an ISO timestamp range"""
+        filters = filters or {}
+        with self._lock:
+            self._ensure_open()
+            positions = []
+            for position in range(len(self._entries) - 1, -1, -1):
+                if len(positions) >= n:
+                    break
+                entry = self._entries[position]
+                timestamp = entry.get('timestamp') or ''
+                if since and timestamp < since:
+                    continue
+                if until and timestamp > until:
+                    continue
+                if any(
+                    (entry['scenario'] if key == 'scenario' else entry['config'].get(key)) != value
+                    for key, value in filters.items()
+                ):
+                    continue
+                positions.append(position)
+            positions.reverse()
+            return self._read(positions)
+
+    def get(self, ids):
+        with self._lock:
+            self._ensure_open()
+            return self._read([i for i in ids if 0 <= i < len(self._entries)])
+
+    def count(self):
+        with self._lock:
+            self._ensure_open()
+            return len(self._entries)
+
+benchmark_log = BenchmarkLogStore(BENCHMARK_LOG_PATH)
+
 def append_benchmark_log(record: dict):
     try:
-        Path(BENCHMARK_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
-        with open(BENCHMARK_LOG_PATH, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(record) + '\n')
+        benchmark_log.append(record)
     except Exception as e:
         # Non-fatal; surface in API responses when appropriate
         print(f"Failed to write benchmark log: {e}")
 
+def summarize_benchmark_record(record):
+    """Flatten the headline numbers of a benchmark record for side-by-side comparison"""
+    producer = record.get('producer') or {}
+    consumer = record.get('consumer') or {}
+    stats = producer.get('stats') or {}
+    throughput = producer.get('throughput') or {}
+    flow = producer.get('flow_control') or {}
+    latency = consumer.get('end_to_end_latency_ms') or {}
+    return {
+        'id': record.get('id'),
+        'timestamp': record.get('timestamp'),
+        'scenario': (record.get('scenario') or {}).get('name'),
+        'config': producer.get('config'),
+        'transport': (producer.get('config') or {}).get('transport', 'http'),
+        'source': (producer.get('config') or {}).get('source', 'random'),
+        'elapsed_seconds': producer.get('elapsed_seconds'),
+        'succeeded': stats.get('succeeded'),
+        'failed': stats.get('failed'),
+        'rejected': stats.get('rejected'),
+        'retries': flow.get('retries'),
+        'concurrency_limit': flow.get('limit'),
+        'requests_per_second': throughput.get('requests_per_second'),
+        'readings_per_second': throughput.get('readings_per_second'),
+        'bytes_per_second': throughput.get('bytes_per_second'),
+        'consumer_processed': consumer.get('processed_count'),
+        'consumer_duplicates': consumer.get('duplicate_count'),
+        'latency_p50_ms': latency.get('p50'),
+        'latency_p99_ms': latency.get('p99')
+    }
+
+def consumer_label(index):
+    return 'consumer' if len(CONSUMER_URLS) == 1 else f"consumer-{index + 1}"
+
+def fetch_from_consumers(path, timeout=5):
+    """GET path from every consumer shard concurrently; returns [(url, json or None, error or None)]"""
+    def fetch(url):
+        try:
+            response = requests.get(f"{url}{path}", timeout=timeout)
+            if not response.ok:
+                return url, None, f'HTTP {response.status_code}'
+            return url, response.json(), None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return url, None, str(e)
+    with ThreadPoolExecutor(max_workers=len(CONSUMER_URLS)) as pool:
+        return list(pool.map(fetch, CONSUMER_URLS))
+
+# Relayed headers for byte-for-byte pass-through of consumer responses
+RELAY_RESPONSE_HEADERS = ('Content-Type', 'Content-Length', 'Content-Encoding', 'ETag', 'Cache-Control')
+RELAY_CHUNK_BYTES = 64 * 1024
+
+def relay_from_consumer(url, path, timeout=10):
+    """Stream a consumer response through unparsed, forwarding If-None-Match and the caching headers"""
+    headers = {'If-None-Match': request.headers['If-None-Match']} if 'If-None-Match' in request.headers else {}
+    upstream = requests.get(f"{url}{path}", headers=headers, timeout=timeout, stream=True)
+    if not upstream.ok and upstream.status_code != 304:
+        upstream.close()
+        return None
+    response = Response(
+        upstream.raw.stream(RELAY_CHUNK_BYTES, decode_content=False),
+        status=upstream.status_code,
+        headers={name: upstream.headers[name] for name in RELAY_RESPONSE_HEADERS if name in upstream.headers}
+    )
+    response.call_on_close(upstream.close)
+    return response
+
+# Sharded /view-all-data: each shard's entries by ETag, plus the merged body built from them
+view_shard_cache = {}  # url -> (etag, entries)
+view_merged_cache = {'key': None, 'body': b'', 'etag': None}
+view_cache_lock = threading.Lock()
+
+def fetch_shard_view(url):
+    """Conditional GET of one shard's /view-all-data; returns (url, (etag, entries) or None, error or None)"""
+    cached = view_shard_cache.get(url)
+    headers = {'If-None-Match': cached[0]} if cached and cached[0] else {}
+    try:
+        response = requests.get(f"{url}/view-all-data", headers=headers, timeout=10)
+        if response.status_code == 304 and cached:
+            return url, cached, None
+        if not response.ok:
+            return url, None, f'HTTP {response.status_code}'
+        entry = (response.headers.get('ETag'), response.json().get('data', []))
+        view_shard_cache[url] = entry
+        return url, entry, None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return url, None, str(e)
+
+def merge_latency_snapshots(snapshots):
+    """Combine consumer latency histograms (same bucket bounds) into one snapshot"""
+    snapshots = [snap for snap in snapshots if snap and snap.get('count')]
+    if not snapshots:
+        return {'count': 0, 'mean_ms': None, 'min_ms': None, 'max_ms': None, 'p50': None, 'p90': None, 'p99': None, 'buckets': []}
+    bounds = [bucket['le'] for bucket in snapshots[0]['buckets']]
+    counts = [sum(snap['buckets'][i]['count'] for snap in snapshots) for i in range(len(bounds))]
+    count = sum(counts)
+    high = max(snap['max_ms'] for snap in snapshots)
+
+    def quantile(q):
+        seen = 0
+        for bound, bucket_count in zip(bounds, counts):
+            seen += bucket_count
+            if seen >= q * count and bucket_count:
+                return high if bound == '+Inf' else bound
+        return high
+
+    return {
+        'count': count,
+        'mean_ms': sum(snap['mean_ms'] * snap['count'] for snap in snapshots) / count,
+        'min_ms': min(snap['min_ms'] for snap in snapshots),
+        'max_ms': high,
+        'p50': quantile(0.5),
+        'p90': quantile(0.9),
+        'p99': quantile(0.99),
+        'buckets': [{'le': bound, 'count': bucket_count} for bound, bucket_count in zip(bounds, counts)]
+    }
+
+def fetch_consumer_benchmark_stats():
+    """Benchmark counters summed across shards, with each shard's own stats under 'shards'"""
+    results = fetch_from_consumers('/benchmark/stats')
+    stats = [data for _, data, _ in results if data]
+    started = [s['started_at'] for s in stats if s.get('started_at')]
+    updated = [s['last_updated_at'] for s in stats if s.get('last_updated_at')]
+    return {
+        'enabled': any(s.get('enabled') for s in stats),
+        'started_at': min(started) if started else None,
+        'last_updated_at': max(updated) if updated else None,
+        'processed_count': sum(s.get('processed_count', 0) for s in stats),
+        'bytes_received': sum(s.get('bytes_received', 0) for s in stats),
+        'duplicate_count': sum(s.get('duplicate_count', 0) for s in stats),
+        'end_to_end_latency_ms': merge_latency_snapshots([s.get('end_to_end_latency_ms') for s in stats]),
+        'shards': [
+            {'url': url, **(data if data else {'error': error})}
+            for url, data, error in results
+        ]
+    }
+
+def route_to_shard(sensor_id):
+    """Ask the producer's ring which shard should take a sensor's reading (first shard as fallback)"""
+    if sensor_id is None or len(CONSUMER_URLS) == 1:
+        return CONSUMER_URLS[0]
+    try:
+        route = requests.get(f"{PRODUCER_URL}/shards", params={'sensor_id': sensor_id}, timeout=3).json()['route']
+        return route['failover_order'][0]
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError):
+        return CONSUMER_URLS[0]
+
+# Profiles captured alongside benchmark runs (speedscope files next to the benchmark log)
+PROFILE_DIR = Path(BENCHMARK_LOG_PATH).parent / 'profiles'
+PROFILE_HZ = int(os.getenv('PROFILE_HZ', 100))
+profile_captures = {}
+profile_threads = []
+profile_services = []  # (service, url) of the capture in progress
+
+def capture_profile(service, url, seconds, hz, run_id):
+    """Profile one service for `seconds` and save the speedscope file under PROFILE_DIR"""
+    try:
+        response = requests.get(
+            f"{url}/admin/profile",
+            params={'seconds': seconds, 'hz': hz, 'format': 'speedscope'},
+            timeout=seconds + 15
+        )
+        if not response.ok:
+            profile_captures[service] = {'error': f'HTTP {response.status_code}'}
+            return
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        filename = f"{run_id}_{service}.speedscope.json"
+        (PROFILE_DIR / filename).write_bytes(response.content)
+        profile_captures[service] = {'file': filename, 'url': f"/api/profiles/{filename}"}
+    except Exception as e:
+        profile_captures[service] = {'error': str(e)}
+
+def start_profile_capture(seconds, hz):
+    """Profile the producer and every consumer shard concurrently in the background"""
+    global profile_threads, profile_services
+    run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+    profile_captures.clear()
+    profile_services = [('producer', PRODUCER_URL)] + [(consumer_label(i), url) for i, url in enumerate(CONSUMER_URLS)]
+    profile_threads = [
+        threading.Thread(target=capture_profile, args=(service, url, seconds, hz, run_id), daemon=True)
+        for service, url in profile_services
+    ]
+    for t in profile_threads:
+        t.start()
+
+def stop_profile_capture():
+    """Ask every profiled service to end its capture now, so it returns what it has sampled"""
+    def stop(url):
+        try:
+            requests.get(f"{url}/admin/profile/stop", timeout=3)
+        except requests.exceptions.RequestException:
+            pass
+    with ThreadPoolExecutor(max_workers=len(profile_services)) as pool:
+        list(pool.map(stop, [url for _, url in profile_services]))
+
+def collect_profile_capture(timeout):
+    """Wait up to `timeout` seconds in total for the captures; ones still running are reported as such"""
+    deadline = time.monotonic() + timeout
+    for t in profile_threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+    captures = dict(profile_captures)
+    for service, _ in profile_services:
+        captures.setdefault(service, {'error': f'Capture still running after {timeout}s'})
+    return captures
+
+# Scenario sweeps: declarative benchmark steps run back to back by a background runner
+SCENARIO_DIR = Path(os.getenv('SCENARIO_DIR', str(Path(__file__).parent / 'scenarios')))
+SCENARIO_PARAMS = ('duration_seconds', 'payload_bytes', 'workers', 'batch_size', 'target_rps', 'transport', 'flow_control',
+                   'source', 'fleet_size', 'rate_skew')
+SCENARIO_DEFAULTS = {
+    'duration_seconds': 10,
+    'payload_bytes': 512,
+    'workers': 4,
+    'batch_size': 1,
+    'target_rps': 0,
+    'transport': 'http',
+    'flow_control': True,
+    'source': 'random'
+}
+scenario_stop = threading.Event()
+scenario_state = {
+    'running': False,
+    'name': None,
+    'phase': 'idle',
+    'step': 0,
+    'total_steps': 0,
+    'config': None,
+    'started_at': None,
+    'ended_at': None,
+    'error': None,
+    'results': []
+}
+
+def load_scenario_file(filename):
+    """Read a YAML or JSON scenario from SCENARIO_DIR"""
+    path = (SCENARIO_DIR / filename).resolve()
+    if SCENARIO_DIR.resolve() not in path.parents or not path.is_file():
+        raise ValueError(f'Unknown scenario file: {filename}')
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix in ('.yaml', '.yml'):
+            scenario = yaml.safe_load(f)
+        else:
+            scenario = json.load(f)
+    if not isinstance(scenario, dict):
+        raise ValueError(f'Scenario file {filename} must contain a mapping at the top level')
+    scenario.setdefault('name', path.stem)
+    return scenario
+
+def expand_scenario_steps(scenario):
+    """Turn a scenario into a list of benchmark configs: explicit `steps`, else the product of `sweep`"""
+    if not isinstance(scenario, dict):
+        raise ValueError(f'Scenario must be a mapping, got {type(scenario).__name__}')
+    base = {**SCENARIO_DEFAULTS, **scenario.get('defaults', {})}
+    if scenario.get('steps'):
+        overrides = scenario['steps']
+    else:
+        sweep = scenario.get('sweep', {})
+        keys = list(sweep)
+        overrides = [dict(zip(keys, combo)) for combo in itertools.product(*(sweep[k] for k in keys))]
+    steps = []
+    for override in overrides:
+        unknown = set(override) - set(SCENARIO_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown scenario parameter(s): {', '.join(sorted(unknown))}")
+        steps.append({**base, **override})
+    if not steps:
+        raise ValueError('Scenario has no steps')
+    return steps
+
+def _run_producer_phase(config):
+    """Run one producer benchmark to completion (or until the scenario is stopped); return its final status"""
+    resp = requests.post(f"{PRODUCER_URL}/benchmark/start", json=config, timeout=10)
+    if not resp.ok:
+        raise RuntimeError(f"Producer refused benchmark (HTTP {resp.status_code})")
+    deadline = time.time() + config['duration_seconds'] + 30
+    while time.time() < deadline and not scenario_stop.wait(0.5):
+        status = requests.get(f"{PRODUCER_URL}/benchmark/status", timeout=5).json()
+        if not status.get('running'):
+            return status
+    requests.get(f"{PRODUCER_URL}/benchmark/stop", timeout=5)
+    return requests.get(f"{PRODUCER_URL}/benchmark/status", timeout=5).json()
+
+def wait_for_queue_drain(timeout=30):
+    """With the queue transport, let the consumer finish pulling before counters are read"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            stats = requests.get(f"{PRODUCER_URL}/queue/stats", timeout=5).json()
+        except (requests.exceptions.RequestException, ValueError):
+            return
+        if stats.get('depth', 0) == 0:
+            return
+        time.sleep(0.25)
+
+def _summarize_step(record):
+    return {'step': record['scenario']['step'], **summarize_benchmark_record(record)}
+
+def run_scenario(name, steps, warmup_seconds, cooldown_seconds):
+    """Execute scenario steps in order, logging one benchmark record per step"""
+    try:
+        for index, config in enumerate(steps, start=1):
+            if scenario_stop.is_set():
+                break
+            scenario_state.update(step=index, config=config, phase='warmup')
+            if warmup_seconds > 0:
+                _run_producer_phase({**config, 'duration_seconds': warmup_seconds})
+            if scenario_stop.is_set():
+                break
+
+            scenario_state['phase'] = 'measure'
+            fetch_from_consumers('/benchmark/enable')
+            producer_status = _run_producer_phase(config)
+            if config.get('transport') == 'queue':
+                wait_for_queue_drain()
+            fetch_from_consumers('/benchmark/disable')
+            record = {
+                'producer': producer_status,
+                'consumer': fetch_consumer_benchmark_stats(),
+                'timestamp': datetime.now().isoformat(),
+                'scenario': {
+                    'name': name,
+                    'step': index,
+                    'total_steps': len(steps),
+                    'config': config,
+                    'warmup_seconds': warmup_seconds,
+                    'cooldown_seconds': cooldown_seconds
+                }
+            }
+            append_benchmark_log(record)
+            scenario_state['results'].append(_summarize_step(record))
+            print(f"📈 Scenario {name}: step {index}/{len(steps)} done")
+
+            if cooldown_seconds > 0 and index < len(steps):
+                scenario_state['phase'] = 'cooldown'
+                scenario_stop.wait(cooldown_seconds)
+    except Exception as e:
+        scenario_state['error'] = str(e)
+        print(f"❌ Scenario {name} failed: {e}")
+    finally:
+        scenario_state.update(running=False, phase='stopped' if scenario_stop.is_set() else 'idle', ended_at=datetime.now().isoformat())
+
+def start_scenario(scenario):
+    """Validate a scenario and launch its runner thread; returns the expanded steps"""
+    steps = expand_scenario_steps(scenario)
+    name = scenario.get('name', 'inline')
+    scenario_stop.clear()
+    scenario_state.update(
+        running=True, name=name, phase='starting', step=0, total_steps=len(steps), config=None,
+        started_at=datetime.now().isoformat(), ended_at=None, error=None, results=[]
+    )
+    threading.Thread(
+        target=run_scenario,
+        args=(name, steps, float(scenario.get('warmup_seconds', 0)), float(scenario.get('cooldown_seconds', 0))),
+        daemon=True
+    ).start()
+    return steps
+
 def check_service_health(service_name, url):
     """Check if a service is healthy"""
     try:
@@ -56,7 +557,10 @@ def benchmark_page():
 def api_status():
     """API endpoint to check service status"""
     producer_healthy = check_service_health('Producer', PRODUCER_URL)
-    consumer_healthy = check_service_health('Consumer', CONSUMER_URL)
+    consumers = [
+        {'url': url, 'healthy': data is not None}
+        for url, data, _ in fetch_from_consumers('/status', timeout=3)
+    ]
     
     return jsonify({
         'producer': {
@@ -64,9 +568,12 @@ def api_status():
             'url': PRODUCER_URL
         },
         'consumer': {
-            'healthy': consumer_healthy,
-            'url': CONSUMER_URL
+            'healthy': all(c['healthy'] for c in consumers),
+            'url': CONSUMER_URLS[0],
+            'healthy_shards': sum(c['healthy'] for c in consumers),
+            'total_shards': len(consumers)
         },
+        'consumers': consumers,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -75,10 +582,14 @@ def api_metrics():
     """Fetch metrics from producer and consumer services"""
     try:
         prod = requests.get(f"{PRODUCER_URL}/metrics", timeout=3)
-        cons = requests.get(f"{CONSUMER_URL}/metrics", timeout=3)
+        consumers = [
+            {'name': consumer_label(i), **(data if data else {'error': 'unavailable'})}
+            for i, (_, data, _) in enumerate(fetch_from_consumers('/metrics', timeout=3))
+        ]
         return jsonify({
             'producer': prod.json() if prod.ok else {'error': 'unavailable'},
-            'consumer': cons.json() if cons.ok else {'error': 'unavailable'},
+            'consumer': consumers[0],
+            'consumers': consumers,
             'timestamp': datetime.now().isoformat()
         })
     except requests.exceptions.RequestException as e:
@@ -110,11 +621,11 @@ def api_send_data():
 
 @app.route('/api/process-data', methods=['POST'])
 def api_process_data():
-    """Process data through consumer"""
+    """Process data through the consumer shard that owns the reading's sensor"""
     try:
         data = request.get_json()
         response = requests.post(
-            f"{CONSUMER_URL}/process-data",
+            f"{route_to_shard((data or {}).get('sensor_id'))}/process-data",
             json=data,
             headers={'Content-Type': 'application/json'},
             timeout=5
@@ -130,7 +641,7 @@ def api_process_data():
 def api_get_processed_data():
     """Get processed data from consumer"""
     try:
-        response = requests.get(f"{CONSUMER_URL}/get-processed-data", timeout=10)
+        response = requests.get(f"{CONSUMER_URLS[0]}/get-processed-data", timeout=10)
         if response.status_code == 200:
             return jsonify(response.json())
         else:
@@ -176,27 +687,92 @@ def api_automation_status():
 
 @app.route('/api/view-all-data')
 def api_view_all_data():
-    """View all processed data"""
-    try:
-        response = requests.get(f"{CONSUMER_URL}/view-all-data", timeout=10)
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': 'Failed to get data history'}), 500
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Error connecting to consumer: {str(e)}'}), 500
+    """View all processed data, merged across consumer shards by processing time"""
+    if len(CONSUMER_URLS) == 1:
+        try:
+            response = relay_from_consumer(CONSUMER_URLS[0], '/view-all-data')
+            if response is None:
+                return jsonify({'error': 'Failed to get processed data'}), 500
+            return response
+        except requests.exceptions.RequestException as e:
+            return jsonify({'error': f'Error connecting to consumer: {str(e)}'}), 500
+
+    with ThreadPoolExecutor(max_workers=len(CONSUMER_URLS)) as pool:
+        results = list(pool.map(fetch_shard_view, CONSUMER_URLS))
+    if all(entry is None for _, entry, _ in results):
+        return jsonify({'error': f'Error connecting to consumer: {results[0][2]}'}), 500
+    # Re-merge only when some shard's ETag changed or a shard came or went; a shard that
+    # sends no ETag (None in the key) forces a rebuild every time and disables the merged ETag
+    key = tuple(entry[0] if entry else 'unavailable' for _, entry, _ in results)
+    cacheable = all(key)
+    with view_cache_lock:
+        if view_merged_cache['key'] != key or not cacheable:
+            entries = sorted(
+                (item for _, entry, _ in results if entry for item in entry[1]),
+                key=lambda item: item.get('processed_at', '')
+            )
+            body = app.json.dumps({
+                'message': f'Retrieved {len(entries)} processed data entries',
+                'total_entries': len(entries),
+                'data': entries,
+                'shards_unavailable': [url for url, entry, _ in results if entry is None],
+                'timestamp': datetime.now().isoformat()
+            }).encode('utf-8')
+            etag = hashlib.md5(repr(key).encode('utf-8')).hexdigest()[:16] if cacheable else None
+            view_merged_cache.update(key=key, body=body, etag=etag)
+        body, etag = view_merged_cache['body'], view_merged_cache['etag']
+    response = Response(body, mimetype='application/json')
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/export')
+def api_export():
+    """Stream every shard's history as one NDJSON download, shard after shard, without parsing it"""
+    query = request.query_string.decode('utf-8')
+    path = f"/export?{query}" if query else '/export'
+    upstreams, unavailable = [], []
+    for url in CONSUMER_URLS:
+        try:
+            upstream = requests.get(f"{url}{path}", timeout=10, stream=True)
+            if upstream.ok:
+                upstreams.append(upstream)
+                continue
+            upstream.close()
+        except requests.exceptions.RequestException:
+            pass
+        unavailable.append(url)
+    if not upstreams:
+        return jsonify({'error': 'Error connecting to consumer'}), 500
+
+    def relay():
+        for upstream in upstreams:
+            yield from upstream.iter_content(RELAY_CHUNK_BYTES)
+
+    response = Response(relay(), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename=processed-data.ndjson',
+        'X-Total-Entries': str(sum(int(upstream.headers.get('X-Total-Entries', 0)) for upstream in upstreams))
+    })
+    if unavailable:
+        response.headers['X-Shards-Unavailable'] = ','.join(unavailable)
+    for upstream in upstreams:
+        response.call_on_close(upstream.close)
+    return response
 
 @app.route('/api/clear-history')
 def api_clear_history():
-    """Clear data history"""
-    try:
-        response = requests.get(f"{CONSUMER_URL}/clear-history", timeout=5)
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': 'Failed to clear history'}), 500
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Error connecting to consumer: {str(e)}'}), 500
+    """Clear data history on every consumer shard"""
+    results = fetch_from_consumers('/clear-history')
+    failed = [url for url, data, _ in results if data is None]
+    if len(failed) == len(results):
+        return jsonify({'error': 'Failed to clear history'}), 500
+    return jsonify({
+        'message': ' '.join(data['message'] for _, data, _ in results if data),
+        'total_entries': 0,
+        'shards_failed': failed
+    })
 
 # -----------------------------
 # Benchmark orchestration APIs
@@ -205,17 +781,23 @@ def api_clear_history():
 @app.route('/api/benchmark/start', methods=['POST'])
 def api_benchmark_start():
     """Enable consumer counters and start producer benchmark."""
+    if scenario_state['running']:
+        return jsonify({'error': f"Scenario {scenario_state['name']} is running"}), 409
     try:
         payload = request.get_json(force=True)
         duration = int(payload.get('duration_seconds', 15))
         payload_bytes = int(payload.get('payload_bytes', 512))
         workers = int(payload.get('workers', 4))
+        batch_size = int(payload.get('batch_size', 1))
+        target_rps = float(payload.get('target_rps', 0))
+        transport = payload.get('transport', 'http')
+        flow_control = bool(payload.get('flow_control', True))
+        # Fleet options are only forwarded when given so the producer's defaults apply
+        source_options = {k: payload[k] for k in ('source', 'fleet_size', 'rate_skew') if k in payload}
+        profile = bool(payload.get('profile', False))
 
-        # Enable consumer tracking
-        try:
-            requests.get(f"{CONSUMER_URL}/benchmark/enable", timeout=5)
-        except requests.exceptions.RequestException:
-            pass
+        # Enable consumer tracking on every shard
+        fetch_from_consumers('/benchmark/enable')
 
         # Start producer benchmark
         resp = requests.post(
@@ -223,11 +805,19 @@ def api_benchmark_start():
             json={
                 'duration_seconds': duration,
                 'payload_bytes': payload_bytes,
-                'workers': workers
+                'workers': workers,
+                'batch_size': batch_size,
+                'target_rps': target_rps,
+                'transport': transport,
+                'flow_control': flow_control,
+                **source_options
             },
             headers={'Content-Type': 'application/json'},
             timeout=10
         )
+        # Profile both services for the length of the run
+        if profile and resp.ok:
+            start_profile_capture(duration, PROFILE_HZ)
         return jsonify(resp.json()), resp.status_code
     except Exception as e:
         return jsonify({'error': f'Failed to start benchmark: {str(e)}'}), 400
@@ -237,10 +827,9 @@ def api_benchmark_status():
     """Return combined status from producer and consumer."""
     try:
         prod = requests.get(f"{PRODUCER_URL}/benchmark/status", timeout=5)
-        cons = requests.get(f"{CONSUMER_URL}/benchmark/stats", timeout=5)
         return jsonify({
             'producer': prod.json() if prod.ok else {'error': 'producer status error'},
-            'consumer': cons.json() if cons.ok else {'error': 'consumer status error'},
+            'consumer': fetch_consumer_benchmark_stats(),
             'timestamp': datetime.now().isoformat()
         })
     except requests.exceptions.RequestException as e:
@@ -251,44 +840,153 @@ def api_benchmark_stop():
     """Stop the producer benchmark and disable consumer tracking; log results."""
     try:
         prod = requests.get(f"{PRODUCER_URL}/benchmark/stop", timeout=5)
-        cons_disable = requests.get(f"{CONSUMER_URL}/benchmark/disable", timeout=5)
+        if (prod.json().get('config') or {}).get('transport') == 'queue':
+            wait_for_queue_drain()
+        fetch_from_consumers('/benchmark/disable')
         # Fetch final stats
         prod_status = requests.get(f"{PRODUCER_URL}/benchmark/status", timeout=5)
-        cons_stats = requests.get(f"{CONSUMER_URL}/benchmark/stats", timeout=5)
         result = {
             'producer': prod_status.json() if prod_status.ok else {'error': 'producer status error'},
-            'consumer': cons_stats.json() if cons_stats.ok else {'error': 'consumer stats error'},
+            'consumer': fetch_consumer_benchmark_stats(),
             'timestamp': datetime.now().isoformat()
         }
+        if profile_threads:
+            # A run stopped early would otherwise wait out the full capture length
+            stop_profile_capture()
+            result['profiles'] = collect_profile_capture(timeout=10)
+            profile_threads.clear()
         # Persist log entry
         append_benchmark_log(result)
         return jsonify(result)
     except requests.exceptions.RequestException as e:
         return jsonify({'error': f'Error stopping benchmark: {str(e)}'}), 500
 
+@app.route('/api/shards')
+def api_shards():
+    """Per-shard status, benchmark counters and producer routing health, plus merged totals"""
+    statuses = fetch_from_consumers('/status', timeout=3)
+    benchmark = fetch_consumer_benchmark_stats()
+    try:
+        routing = {s['url']: s for s in requests.get(f"{PRODUCER_URL}/shards", timeout=3).json().get('shards', [])}
+    except (requests.exceptions.RequestException, ValueError):
+        routing = {}
+    shards = []
+    for i, ((url, status, error), stats) in enumerate(zip(statuses, benchmark['shards'])):
+        shards.append({
+            'name': consumer_label(i),
+            'url': url,
+            'healthy': status is not None,
+            'error': error,
+            'status': status,
+            'benchmark': stats,
+            'routing': routing.get(url)
+        })
+    return jsonify({
+        'shards': shards,
+        'merged': {
+            'healthy_shards': sum(s['healthy'] for s in shards),
+            'total_shards': len(shards),
+            'history_entries': sum((s['status'] or {}).get('history_entries', 0) for s in shards),
+            'benchmark': {k: v for k, v in benchmark.items() if k != 'shards'}
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/api/benchmark/logs')
 def api_benchmark_logs():
-    """Return last N benchmark log lines (default 10)."""
+    """Return the last N benchmark records (default 10), optionally filtered.
+
+    Filters: workers, payload_bytes, batch_size, target_rps, duration_seconds,
+    transport, source, scenario, and since/until (ISO timestamps or date prefixes).
+    """
     try:
         n = int(request.args.get('n', 10))
-        if not Path(BENCHMARK_LOG_PATH).exists():
-            return jsonify({'logs': [], 'path': BENCHMARK_LOG_PATH})
-        with open(BENCHMARK_LOG_PATH, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        tail = lines[-n:]
-        # Parse JSONL
-        logs = []
-        for line in tail:
-            try:
-                logs.append(json.loads(line))
-            except Exception:
-                continue
-        return jsonify({'logs': logs, 'path': BENCHMARK_LOG_PATH})
+        filters = {}
+        for key in INDEXED_CONFIG_FIELDS:
+            if key in ('transport', 'source') and key in request.args:
+                filters[key] = request.args[key]
+            elif key in request.args:
+                filters[key] = float(request.args[key]) if key == 'target_rps' else int(request.args[key])
+        if 'scenario' in request.args:
+            filters['scenario'] = request.args['scenario']
+        until = request.args.get('until')
+        if until and len(until) == 10:
+            # A bare date includes the whole day
+            until += 'T99'
+        logs = benchmark_log.query(n, filters, request.args.get('since'), until)
+        return jsonify({'logs': logs, 'total': benchmark_log.count(), 'path': BENCHMARK_LOG_PATH})
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Error reading logs: {str(e)}'}), 500
 
+@app.route('/api/benchmark/compare')
+def api_benchmark_compare():
+    """Side-by-side headline metrics for the runs given as ?ids=1,5,9"""
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+    except ValueError as e:
+        return jsonify({'error': f'Invalid ids: {str(e)}'}), 400
+    if not ids:
+        return jsonify({'error': 'No run ids given'}), 400
+    records = benchmark_log.get(ids)
+    return jsonify({
+        'runs': [summarize_benchmark_record(record) for record in records],
+        'missing': sorted(set(ids) - {record['id'] for record in records})
+    })
+
+@app.route('/api/scenarios')
+def api_scenarios():
+    """List scenario files available to the runner"""
+    files = []
+    if SCENARIO_DIR.is_dir():
+        files = sorted(p.name for p in SCENARIO_DIR.iterdir() if p.suffix in ('.json', '.yaml', '.yml'))
+    return jsonify({'scenarios': files, 'path': str(SCENARIO_DIR)})
+
+@app.route('/api/scenarios/run', methods=['POST'])
+def api_scenarios_run():
+    """Run a scenario: {"file": "<name>"} from SCENARIO_DIR or an inline {"scenario": {...}}"""
+    if scenario_state['running']:
+        return jsonify({'error': f"Scenario {scenario_state['name']} is already running"}), 409
+    try:
+        payload = request.get_json(force=True)
+        scenario = load_scenario_file(payload['file']) if 'file' in payload else payload['scenario']
+        steps = start_scenario(scenario)
+        return jsonify({'started': True, 'name': scenario_state['name'], 'steps': steps}), 202
+    except (KeyError, ValueError, TypeError, yaml.YAMLError) as e:
+        return jsonify({'error': f'Invalid scenario: {str(e)}'}), 400
+
+@app.route('/api/scenarios/status')
+def api_scenarios_status():
+    """Progress of the current (or last) scenario and its per-step summaries"""
+    return jsonify(scenario_state)
+
+@app.route('/api/scenarios/stop', methods=['POST'])
+def api_scenarios_stop():
+    """Abort the running scenario after stopping the current producer phase"""
+    scenario_stop.set()
+    return jsonify({'stopping': scenario_state['running'], 'name': scenario_state['name']})
+
+@app.route('/api/profile')
+def api_profile():
+    """Profile producer and consumer right now and return links to the speedscope files"""
+    try:
+        seconds = float(request.args.get('seconds', 5))
+        hz = int(request.args.get('hz', PROFILE_HZ))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid profile parameters: {str(e)}'}), 400
+    start_profile_capture(seconds, hz)
+    profiles = collect_profile_capture(timeout=seconds + 20)
+    profile_threads.clear()
+    return jsonify({'profiles': profiles, 'timestamp': datetime.now().isoformat()})
+
+@app.route('/api/profiles/<path:filename>')
+def api_profile_file(filename):
+    """Download a captured speedscope profile"""
+    return send_from_directory(PROFILE_DIR, filename, as_attachment=True)
+
 if __name__ == '__main__':
     print(f"WEB UI STARTED on port {SERVICE_PORT}")
     print(f"Producer URL: {PRODUCER_URL}")
-    print(f"Consumer URL: {CONSUMER_URL}")
+    print(f"Consumer shards: {', '.join(CONSUMER_URLS)}")
     app.run(host='0.0.0.0', port=SERVICE_PORT, debug=True)